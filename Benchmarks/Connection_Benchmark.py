@@ -0,0 +1,217 @@
+"""
+Throughput and latency benchmark for Connection/Device against the simulated serial backend.
+
+Usage:
+    python Benchmarks/Connection_Benchmark.py --output bench.json
+    python Benchmarks/Connection_Benchmark.py --output new.json --compare bench.json --tolerance 0.2
+
+Every case reports calls/sec, valve-ops/sec, bytes and frames written per logical operation,
+and p50/p99 latency from the call to the last byte reaching the simulated wire.
+With --compare, exits non-zero if a case regressed beyond the tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import sys
+import time
+from typing import Callable, Dict, List
+
+try:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    BASE_DIR = os.getcwd()
+
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+from Connection.Connection import Connection
+from Connection.Simulator import VirtualRig
+
+BOARD_COUNTS = [1, 2, 4, 8, 16]
+
+
+def buildRig(num_boards: int, throttle: bool):
+    """Create a Connection wired to `num_boards` simulated boards."""
+    port_map = {
+        f"SIM{i:02d}": {"start_number": 24 * i, "polarities": [i % 2 == 0] * 3}
+        for i in range(num_boards)
+    }
+    rig = VirtualRig(port_map, throttle=throttle)
+    with contextlib.redirect_stdout(io.StringIO()):
+        connection = Connection(backend=rig)
+        connection.PORT_TO_START = port_map
+        connection.scanForDevices()
+    connection.waitForWrites(timeout=5.0)
+    return connection, rig
+
+
+def wireTotals(rig: VirtualRig):
+    ports = list(rig.ports.values())
+    return sum(p.bytes_written for p in ports), sum(p.write_calls for p in ports)
+
+
+def lastFrameTime(rig: VirtualRig) -> float:
+    return max((b.frames[-1][0] for b in rig.boards.values() if b.frames), default=0.0)
+
+
+def runCase(name: str, num_boards: int, op: Callable[[Connection, int], int], iterations: int,
+            throttle: bool) -> Dict:
+    """Time `iterations` calls of op(connection, i), which returns the number of valves it touched."""
+    connection, rig = buildRig(num_boards, throttle)
+    bytes_before, frames_before = wireTotals(rig)
+    latencies: List[float] = []
+    valve_ops = 0
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_time = time.perf_counter()
+        valve_ops += op(connection, i)
+        connection.waitForWrites(timeout=5.0)
+        on_wire = lastFrameTime(rig)
+        if on_wire >= call_time:
+            latencies.append(on_wire - call_time)
+    elapsed = time.perf_counter() - started
+
+    bytes_after, frames_after = wireTotals(rig)
+    with contextlib.redirect_stdout(io.StringIO()):
+        connection.disconnectAll()
+
+    latencies.sort()
+    p99_index = min(len(latencies) - 1, int(round(0.99 * (len(latencies) - 1))))
+    return {
+        "name": name,
+        "boards": num_boards,
+        "iterations": iterations,
+        "valve_ops": valve_ops,
+        "calls_per_sec": iterations / elapsed if elapsed > 0 else 0.0,
+        "valve_ops_per_sec": valve_ops / elapsed if elapsed > 0 else 0.0,
+        "bytes_per_op": (bytes_after - bytes_before) / iterations,
+        "frames_per_op": (frames_after - frames_before) / iterations,
+        "p50_latency_ms": statistics.median(latencies) * 1e3 if latencies else None,
+        "p99_latency_ms": latencies[p99_index] * 1e3 if latencies else None,
+    }
+
+
+def opSingle(connection: Connection, i: int) -> int:
+    valve = i % len(connection.valve_states)
+    connection.setValveState(valve, not connection.getValveState(valve))
+    return 1
+
+
+def opBulk(connection: Connection, i: int) -> int:
+    valves = range(len(connection.valve_states))
+    connection.setValveStates({v: (v + i) % 2 == 0 for v in valves})
+    return len(valves)
+
+
+def opFlush(connection: Connection, i: int) -> int:
+    connection.flush()
+    return 0
+
+
+def opDeviceSetValves(connection: Connection, i: int) -> int:
+    device = connection.devices[i % len(connection.devices)]
+    connection.valve_states.setRange(device.start_number, 24, (i // len(connection.devices)) % 2 == 0)
+    device.setValves(connection.valve_states)
+    return 24
+
+
+def opValveOnAll(connection: Connection, i: int) -> int:
+    # Same Connection traffic as ValveController.valveOnAll/valveOffAll
+    with connection.batch():
+        for valve in range(len(connection.valve_states)):
+            connection.setValveState(valve, i % 2 == 0)
+    return len(connection.valve_states)
+
+
+def opMuxSwitch(connection: Connection, i: int) -> int:
+    from Experiment.CCC5P2_Experiment import setMuxValves
+    from Experiment_Config import VALVE_ID
+    setMuxValves(connection, VALVE_ID["mux"], i % 16 + 1, scr_update=lambda msg: None)
+    return len(VALVE_ID["mux"])
+
+
+def opFeedCycle(connection: Connection, i: int) -> int:
+    from Experiment import CCC5P2_Experiment as experiment
+    entry = experiment.generateExperimentMatrix()[i % 16]
+    no_waits = {step: 0 for step in experiment.EXPERIMENT_TIMING_CONFIG}
+    with tempfile.TemporaryDirectory() as log_dir:
+        experiment.runExperimentMatrix(connection, [[0] + entry[1:]], delay_min=0, test_mode=True,
+                                       log_fn=lambda msg: None, timing=no_waits,
+                                       log_path=os.path.join(log_dir, "feed_cycle.jsonl"))
+    return 1
+
+
+CASES = [
+    ("setValveState", opSingle, 2000, BOARD_COUNTS),
+    ("setValveStates_bulk", opBulk, 300, BOARD_COUNTS),
+    ("flush", opFlush, 300, BOARD_COUNTS),
+    ("Device.setValves", opDeviceSetValves, 1000, BOARD_COUNTS),
+    ("valveOnAll", opValveOnAll, 300, BOARD_COUNTS),
+    ("setMuxValves", opMuxSwitch, 500, [2, 4]),
+    ("feed_cycle", opFeedCycle, 20, [2, 4]),
+]
+
+
+def compareResults(results: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    """Return a message for every case that is slower or chattier than the baseline."""
+    with open(baseline_path, "r") as f:
+        baseline = {(r["name"], r["boards"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get((result["name"], result["boards"]))
+        if not old:
+            continue
+        label = f"{result['name']} x{result['boards']}"
+        if result["calls_per_sec"] < old["calls_per_sec"] * (1 - tolerance):
+            regressions.append(f"{label}: {result['calls_per_sec']:.0f} calls/s vs {old['calls_per_sec']:.0f}")
+        if result["bytes_per_op"] > old["bytes_per_op"] * (1 + tolerance) + 1e-9:
+            regressions.append(f"{label}: {result['bytes_per_op']:.1f} bytes/op vs {old['bytes_per_op']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_connection.json", help="JSON results file")
+    parser.add_argument("--throttle", action="store_true", help="Limit simulated ports to 115200 baud")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply iteration counts")
+    parser.add_argument("--cases", nargs="*", help="Only run these case names")
+    parser.add_argument("--compare", help="Baseline JSON to gate regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    results = []
+    for name, op, iterations, board_counts in CASES:
+        if args.cases and name not in args.cases:
+            continue
+        for num_boards in board_counts:
+            result = runCase(name, num_boards, op, max(1, int(iterations * args.scale)), args.throttle)
+            results.append(result)
+            p50 = result["p50_latency_ms"]
+            print(f"{name:22s} boards={num_boards:2d} {result['calls_per_sec']:9.0f} calls/s "
+                  f"{result['valve_ops_per_sec']:10.0f} valve-ops/s "
+                  f"{result['bytes_per_op']:7.1f} B/op {result['frames_per_op']:5.2f} frames/op "
+                  f"p50={p50 if p50 is None else round(p50, 3)} ms")
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "throttle": args.throttle,
+            "results": results,
+        }, f, indent=2)
+    print(f"Saved benchmark results to {args.output}")
+
+    if args.compare:
+        regressions = compareResults(results, args.compare, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
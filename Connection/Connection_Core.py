@@ -0,0 +1,537 @@
+''' Qt-free core of the valve controller connection '''
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from serial import Serial
+from serial.tools.list_ports import comports
+from serial.tools.list_ports_common import ListPortInfo
+
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from Connection.Serial_Writer import SerialWriter
+from Connection.Valve_State_Store import ValveStateStore
+from Connection.Serial_Metrics import CommitMetrics, DeviceMetrics, totals
+
+PORT_TIMEOUT_S = 2.0      # Longest a single port may take to open and initialize during a scan
+MAX_SCAN_WORKERS = 16     # Ports opened concurrently during a scan
+
+
+class ConnectionCore:
+    """
+    Valve state, devices and serial I/O without any Qt dependency.
+
+    Changes are reported to plain callbacks: valve listeners get one
+    {valve_id: state} dict per commit, device listeners get device_lost /
+    device_restored events. The Qt Connection adds signals on top.
+    """
+
+    def __init__(self, backend=None, config_path: str = "Connection/Valve_Port_Map.json"):
+        self.backend = backend if backend is not None else SerialBackend()
+        self.valve_states = ValveStateStore()    # Global valve state vector indexed by valve ID
+        self.devices: List[Device] = []          # List of connected Device instances
+        self.devices_by_hwid: Dict[str, Device] = {}   # Same devices, keyed by port hwid
+        self._connecting = set()                 # Devices whose connect is still running after a scan timed out
+        self._device_listeners: List[Callable[[str, Device, dict], None]] = []
+        self._valve_listeners: List[Callable[[Dict[int, bool]], None]] = []
+        self.commit_metrics = CommitMetrics()
+        self._lock = threading.RLock()           # Serializes commits from GUI and runner threads
+        self._batch = threading.local()          # Per-thread staging area for batch()
+        # config_path = "Connection/Valve_Port_Map_Dell_Precision.json"  # map config for other laptop
+        if os.path.exists(config_path):
+            with open(config_path, "r") as f:
+                self.PORT_TO_START = json.load(f)
+        else:
+            print(f"Warning: {config_path} not found.")
+            self.PORT_TO_START = {}
+
+    def scanForDevices(self, progress: Optional[Callable[[str], None]] = None,
+                       port_timeout: float = PORT_TIMEOUT_S):
+        """
+        Scan for available devices and update their states.
+
+        Devices are matched to ports by hwid through `devices_by_hwid`. Every
+        port that needs opening is opened and initialized concurrently, and a
+        port still opening after `port_timeout` seconds is reported and left
+        behind instead of stalling the rest, so a rescan takes about as long
+        as the slowest port. Only boards seen for the first time get their
+        valves reset to closed, and valve listeners are told about the reset;
+        boards that were already known keep the commanded state, which is
+        replayed if they had to reconnect.
+
+        `progress`, if given, is called with a short message as each port is
+        handled; it runs on the scanning thread.
+        """
+        report = progress if progress is not None else (lambda message: None)
+        port_infos = self.backend.listPorts()
+        report(f"Scanning {len(port_infos)} serial port(s)...")
+        present = {port_info.hwid: port_info for port_info in port_infos if port_info.hwid != ""}
+
+        new_devices = []
+        for hwid, port_info in present.items():
+            device = self.devices_by_hwid.get(hwid)
+            if device is None:
+                device = Device(backend=self.backend)
+                device.enabled = True
+                device.port_info = port_info
+                self.configureDevice(device)
+                new_devices.append(device)
+            device.port_info = port_info
+            device.available = True
+
+        for hwid, device in self.devices_by_hwid.items():
+            if hwid not in present:
+                device.available = False
+                device.disconnect()
+
+        # new devices are registered before any port opens, so a connect that
+        # outlasts the scan still finds its device when it replays (_lateConnect)
+        known = [device for device in self.devices_by_hwid.values() if device.available]
+        reset: Dict[int, bool] = {}
+        with self._lock:
+            for device in new_devices:
+                self.devices_by_hwid[device.port_info.hwid] = device
+                self.devices.append(device)
+                self.valve_states.setRange(device.start_number, 24, False)
+                reset.update(dict.fromkeys(range(device.start_number, device.start_number + 24), False))
+        if reset:
+            self._notifyValves(reset)   # A valve toggled before its board was found reads closed again
+        to_connect = [device for device in known + new_devices if device.enabled and not device.isConnected()]
+        connected = self.connectDevices(to_connect, port_timeout, report)
+
+        with self._lock:
+            for device in connected:
+                device.setValves(self.valve_states)
+
+        print("=== Device Port-to-Valve Mapping ===")
+        for device in self.devices:
+            port = device.port_info.device if device.port_info else "UNKNOWN"
+            print(f"{port}: valves {device.start_number} to {device.start_number + 23}")
+            report(f"{port}: valves {device.start_number} to {device.start_number + 23}"
+                   f"{'' if device.isConnected() else ' (not connected)'}")
+
+    def configureDevice(self, device: "Device"):
+        """Set a new device's valve range and bank polarities from the port map."""
+        port = device.port_info.device
+        if port in self.PORT_TO_START:
+            config = self.PORT_TO_START[port]
+            if isinstance(config, dict):
+                device.start_number = config.get("start_number", 0)
+                device.polarities = config.get("polarities", [False, False, False])
+            else:
+                # fallback for older format (backward compatibility)
+                device.start_number = config
+                device.polarities = [False, False, False]
+        else:
+            print(f"Port {port} not in PORT_TO_START, disregard")
+            device.start_number = 0
+            device.polarities = [False, False, False]
+
+    def connectDevices(self, devices: List["Device"], timeout: float,
+                       report: Callable[[str], None]) -> List["Device"]:
+        """
+        Open and handshake ports in parallel; return the devices that connected within `timeout`.
+
+        A port that misses the timeout keeps opening in the background and
+        gets the current valve state replayed if it connects later. It is not
+        opened again while that attempt is still running.
+        """
+        devices = [device for device in devices if device not in self._connecting]
+        if not devices:
+            return []
+        pool = ThreadPoolExecutor(max_workers=min(len(devices), MAX_SCAN_WORKERS), thread_name_prefix="port-open")
+        futures = {}
+        for device in devices:
+            report(f"Connecting {device.port_info.device}...")
+            self._connecting.add(device)
+            futures[pool.submit(device.connect)] = device
+        done, pending = wait(futures, timeout=timeout)
+        pool.shutdown(wait=False)   # A hung open keeps its worker; nothing waits for it
+
+        for future in done:
+            self._connecting.discard(futures[future])
+        for future in pending:
+            device = futures[future]
+            report(f"{device.port_info.device}: no response after {timeout:.1f} s, skipped")
+            future.add_done_callback(lambda _, device=device: self._lateConnect(device))
+        return [futures[future] for future in done if futures[future].isConnected()]
+
+    def _lateConnect(self, device: "Device"):
+        """Replay the commanded state to a device whose connect outlasted its scan."""
+        self._connecting.discard(device)
+        with self._lock:
+            if device in self.devices:
+                device.setValves(self.valve_states)
+
+    def dropDevice(self, device: "Device"):
+        """Mark a device whose port disappeared as unavailable and release its port."""
+        with self._lock:
+            device.available = False
+            device.disconnect()
+        self._notifyDevice("device_lost", device)
+
+    def restoreDevice(self, device: "Device", port_info: ListPortInfo, down_since: Optional[float] = None,
+                      port_timeout: float = PORT_TIMEOUT_S, **fields) -> bool:
+        """
+        Reconnect one device and replay the commanded state of its 24 valves.
+
+        The port is opened outside the commit lock and given at most
+        `port_timeout` seconds, like a scan; a hung open is left to finish in
+        the background and False is returned so the caller retries. Only the
+        bank cache reset and the replay hold the lock, and the replay goes
+        out as a single frame carrying all three banks. Other devices are
+        not touched. With `down_since` (epoch seconds), the restored event
+        carries the outage up to the moment the state was replayed.
+        """
+        device.port_info = port_info
+        device.available = True
+        if device not in self.connectDevices([device], port_timeout, lambda message: None):
+            return False
+        with self._lock:
+            device.resetBankCache()
+            device.setValves(self.valve_states)
+        if down_since is not None:
+            fields.update(down_since=down_since, outage_s=round(time.time() - down_since, 3))
+        self._notifyDevice("device_restored", device, **fields)
+        return True
+
+    def addDeviceListener(self, listener: Callable[[str, "Device", dict], None]):
+        """Call `listener(event, device, fields)` when a device is lost or restored."""
+        self._device_listeners.append(listener)
+
+    def removeDeviceListener(self, listener: Callable[[str, "Device", dict], None]):
+        if listener in self._device_listeners:
+            self._device_listeners.remove(listener)
+
+    @contextmanager
+    def deviceListener(self, listener: Callable[[str, "Device", dict], None]):
+        """Register a device listener for the duration of a with-block."""
+        self.addDeviceListener(listener)
+        try:
+            yield listener
+        finally:
+            self.removeDeviceListener(listener)
+
+    def _notifyDevice(self, event: str, device: "Device", **fields):
+        fields = {
+            "port": device.port_info.device if device.port_info else None,
+            "hwid": device.port_info.hwid if device.port_info else None,
+            "valves": [device.start_number, device.start_number + 23],
+            **fields,
+        }
+        for listener in list(self._device_listeners):
+            try:
+                listener(event, device, fields)
+            except Exception as e:
+                print(f"Device listener failed on {event}: {e}")
+
+    @staticmethod
+    def listAvailablePorts():
+        """List available serial ports with descriptions."""
+        port_infos = sorted(comports(), key=lambda p: p.device)
+        print("Available serial ports:")
+        for port_info in port_infos:
+            print(f"{port_info.device} - {port_info.description} ({port_info.hwid})")
+        return port_infos
+
+    def disconnectAll(self):
+        """Disconnect all devices."""
+        for device in self.devices:
+            device.disconnect()
+
+    def setValveState(self, number: int, state: bool):
+        """Set the state of a specific valve."""
+        self.apply({number: state})
+
+    def setValveStates(self, state_dict: Dict[int, bool]):
+        """Set multiple valve states from a dictionary."""
+        self.apply(state_dict)
+
+    def apply(self, state_dict: Dict[int, bool]):
+        """Stage valve changes inside a batch, or commit them immediately."""
+        staged = getattr(self._batch, "staged", None)
+        if staged is not None:
+            staged.update(state_dict)
+        else:
+            self._commit(dict(state_dict))
+
+    @contextmanager
+    def batch(self):
+        """
+        Stage every valve change made by this thread and commit them on exit.
+
+        The commit sends one frame per affected device and sends a single
+        valve change notification. Batches nest; only the outermost one
+        commits. If the block raises, the staged changes are discarded.
+        """
+        outermost = getattr(self._batch, "staged", None) is None
+        if outermost:
+            self._batch.staged = {}
+        try:
+            yield self
+            if outermost:
+                self._commit(self._batch.staged)
+        finally:
+            if outermost:
+                self._batch.staged = None
+
+    def applyArray(self, ids, states):
+        """
+        Set many valves from an ID array and a matching state array (or scalar).
+
+        Outside a batch the arrays are committed as they are, without going
+        through a per-valve dict; precompiled frames take this path.
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        states = np.broadcast_to(np.asarray(states, dtype=bool), ids.shape)
+        staged = getattr(self._batch, "staged", None)
+        if staged is not None:
+            staged.update(zip(ids.tolist(), states.tolist()))
+        else:
+            self._commitArrays(ids, states)
+
+    def _commit(self, changes: Dict[int, bool]):
+        """Write staged changes to the state map and to the devices they touch."""
+        if not changes:
+            return
+        self._commitArrays(np.fromiter(changes.keys(), dtype=np.intp, count=len(changes)),
+                           np.fromiter(changes.values(), dtype=bool, count=len(changes)))
+
+    def _commitArrays(self, ids: np.ndarray, states: np.ndarray):
+        """Write valve states given as parallel arrays to the state map and to the devices they touch."""
+        if ids.size == 0:
+            return
+        with self._lock:
+            start = time.perf_counter()
+            switched = ids[self.valve_states.getMany(ids) != states]
+            self.valve_states.setMany(ids, states)
+            for device in self.devices:
+                if device.ownsAnyValve(ids):
+                    device.setValves(self.valve_states)
+            self.commit_metrics.recordCommit(len(ids), time.perf_counter() - start, switched)
+
+        self._notifyValves(dict(zip(ids.tolist(), states.tolist())))
+
+    def addValveListener(self, listener: Callable[[Dict[int, bool]], None]):
+        """Call `listener(changes)` after every commit, on the committing thread."""
+        self._valve_listeners.append(listener)
+
+    def removeValveListener(self, listener: Callable[[Dict[int, bool]], None]):
+        if listener in self._valve_listeners:
+            self._valve_listeners.remove(listener)
+
+    def _notifyValves(self, changes: Dict[int, bool]):
+        for listener in list(self._valve_listeners):
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"Valve listener failed: {e}")
+
+    def getValveState(self, number: int) -> bool:
+        """Get the state of a specific valve."""
+        return self.valve_states.get(number, False)
+
+    def flush(self):
+        """Flush the current valve states to all connected devices."""
+        with self._lock:
+            for device in self.devices:
+                device.setValves(self.valve_states)
+
+    def waitForWrites(self, timeout: Optional[float] = None) -> bool:
+        """Block until every device has put its queued frames on the wire."""
+        return all([device.flush(timeout) for device in self.devices])
+
+    def getTrafficCounters(self) -> Dict[str, int]:
+        """Get the bank bytes sent and suppressed by dirty-bank diffing across all devices."""
+        return {
+            "bytes_sent": sum(device.bytes_sent for device in self.devices),
+            "bytes_suppressed": sum(device.bytes_suppressed for device in self.devices),
+        }
+
+    def metricsSnapshot(self) -> dict:
+        """Serial I/O counters for the whole rig, per device (by port) and summed."""
+        devices = {
+            (device.port_info.device if device.port_info else str(id(device))): {
+                **device.metrics.snapshot(),
+                "connected": device.isConnected(),
+                "valves": [device.start_number, device.start_number + 23],
+                "frames_coalesced": device.writer.frames_coalesced,
+                "frames_failed": device.writer.frames_failed,
+                "write_retries": device.writer.retries,
+            }
+            for device in list(self.devices)
+        }
+        return {
+            "time": time.time(),
+            **self.commit_metrics.snapshot(),
+            **self.getTrafficCounters(),
+            "totals": totals(devices),
+            "devices": devices,
+        }
+
+    def getConnectedValveIds(self) -> List[int]:
+        """Get a list of valve IDs for all connected devices."""
+        ids = []
+        for device in self.devices:
+            if device.enabled and device.isConnected():
+                for i in range(device.start_number, device.start_number + 24):
+                    ids.append(i)
+        return ids
+
+
+class SerialBackend:
+    """Opens real serial ports found with comports()."""
+
+    def listPorts(self) -> List[ListPortInfo]:
+        """List available serial ports sorted by device name."""
+        return sorted(comports(), key=lambda p: p.device)
+
+    def open(self, port_info: ListPortInfo) -> Serial:
+        """Open a port with the controller's non-blocking serial settings."""
+        return Serial(port_info.device, baudrate=115200, timeout=0, write_timeout=0)
+
+
+class Device:
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else SerialBackend()
+        self.port_info: Optional[ListPortInfo] = None
+        self.start_number = 0
+        self.polarities = [True, True, True]
+        self.enabled = False
+        self.available = False
+        self.serial_port: Optional[Serial] = None
+        self.solenoid_states = np.zeros(24, dtype=bool)
+        self._polarity_key = None
+        self._polarity_mask = np.zeros(24, dtype=bool)
+        self.last_sent: List[Optional[int]] = [None, None, None]  # Last polarized byte per bank A/B/C
+        self.bytes_sent = 0          # Bank command bytes written to the port
+        self.bytes_suppressed = 0    # Bank command bytes skipped because the bank did not change
+        self.metrics = DeviceMetrics()
+        self.writer = SerialWriter(self)
+
+    def ownsValve(self, number: int) -> bool:
+        """Check if a valve ID falls within this device's 24 solenoids."""
+        return self.start_number <= number < self.start_number + 24
+
+    def ownsAnyValve(self, ids: np.ndarray) -> bool:
+        """Check if any valve ID in an array falls within this device's 24 solenoids."""
+        return bool(((ids >= self.start_number) & (ids < self.start_number + 24)).any())
+
+    def polarityMask(self) -> np.ndarray:
+        """Get the 24-entry XOR mask for the current bank polarities."""
+        polarities = tuple(bool(p) for p in self.polarities)
+        if self._polarity_key != polarities:
+            self._polarity_key = polarities
+            self._polarity_mask = np.repeat(np.array(polarities, dtype=bool), 8)
+        return self._polarity_mask
+
+    def isConnected(self):
+        """Check if the device is connected."""
+        return self.serial_port is not None and self.serial_port.is_open
+
+    def connect(self):
+        """Connect to the device if not already connected."""
+        if self.isConnected() or not self.port_info:
+            return
+        try:
+            self.serial_port = self.backend.open(self.port_info)
+            self.serial_port.write(b'!A' + bytes([0]))
+            self.serial_port.write(b'!B' + bytes([0]))
+            self.serial_port.write(b'!C' + bytes([0]))
+            self.serial_port.flush()
+            self.resetBankCache()
+            self.writer.start()
+            self.metrics.recordConnect()
+            print(f"Connected to {self.port_info.device}")
+        except Exception as e:
+            self.metrics.recordError(e)
+            print(f"Failed to connect to {self.port_info.device}: {e}")
+            self.serial_port = None
+
+    def disconnect(self):
+        """Disconnect from the device."""
+        self.writer.stop()
+        if self.isConnected():
+            self.serial_port.close()
+            print(f"Disconnected from {self.port_info.device}")
+        self.serial_port = None
+        self.resetBankCache()
+
+    def setValves(self, global_states: ValveStateStore):
+        """Set the states of valves based on global states."""
+        if not self.enabled or not self.isConnected():
+            return
+
+        self.solenoid_states = global_states.getRange(self.start_number, 24)
+        banks = global_states.packBanks(self.start_number, self.polarityMask()).tolist()
+        if self.writer.isRunning():
+            self.writer.submitState(banks)
+        else:
+            frame = self.encodeBanks(banks)
+            if frame and not self.write(frame):
+                self.resetBankCache()  # Resend every bank after a failed write
+
+    def encodeBanks(self, banks: List[int]) -> bytes:
+        """Build one frame holding only the banks whose byte differs from the last one sent."""
+        frame = bytearray()
+        for bank, command in enumerate(BANK_COMMANDS):
+            if banks[bank] == self.last_sent[bank]:
+                self.bytes_suppressed += 2
+                continue
+            frame += command + bytes([banks[bank]])
+            self.last_sent[bank] = banks[bank]
+        self.bytes_sent += len(frame)
+        return bytes(frame)
+
+    def resetBankCache(self):
+        """Forget the last sent bank bytes so the next setValves rewrites all banks."""
+        self.last_sent = [None, None, None]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued frames are written and the serial port has drained."""
+        if self.writer.isRunning():
+            return self.writer.waitUntilSent(timeout)
+        if self.serial_port:
+            self.serial_port.flush()
+        return True
+
+    def write(self, data) -> bool:
+        """Write data to the serial port."""
+        if self.serial_port:
+            try:
+                start = time.perf_counter()
+                written = self.serial_port.write(data)
+                written = len(data) if written is None else written
+                self.metrics.recordWrite(written, time.perf_counter() - start, frames=int(written == len(data)))
+                if written < len(data):
+                    print(f"Short write on {self.port_info.device}: {written} of {len(data)} bytes")
+                    return False
+                return True
+            except Exception as e:
+                self.metrics.recordError(e)
+                print(f"Write failed on {self.port_info.device}: {e}")
+        return False
+
+BANK_COMMANDS = (b'A', b'B', b'C')
+
+def convertToByte(bits: List[bool]) -> bytes:
+    """Convert a list of boolean values to a single byte."""
+    value = 0
+    for i, bit in enumerate(bits):
+        if bit:
+            value |= 1 << i
+    return bytes([value])
+
+def refreshDeviceList():
+    """Refresh the list of available serial ports."""
+    port_infos = sorted(comports(), key=lambda p: p.device)
+    print("Available serial ports:")
+    for port_info in port_infos:
+        print(f"{port_info.device} - {port_info.description} ({port_info.hwid})")
+    return port_infos
+
+
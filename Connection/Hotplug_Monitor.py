@@ -0,0 +1,68 @@
+''' Background monitor that reconnects valve controller boards after a USB drop '''
+
+from typing import Dict, Optional
+import threading
+import time
+
+HOTPLUG_POLL_INTERVAL_S = 0.25   # Port list poll period; a re-plugged board is back within about this long
+
+
+class HotplugMonitor:
+    """
+    Watch the port list and reconnect only the boards that dropped off.
+
+    Every poll lists ports through the connection's backend (comports() reads
+    sysfs on Linux, the same source as /dev/serial/by-id) and compares the
+    hwids against Connection.devices_by_hwid. A known device whose hwid
+    disappears is dropped; when the same hwid shows up again, that one device
+    is reconnected and the commanded state of its 24 valves is replayed.
+    Boards that stayed connected are never touched, and ports that were
+    never scanned are left to scanForDevices().
+
+    Outages are reported through the connection's device listeners as
+    `device_lost` and `device_restored` (with `outage_s` and `down_since`).
+    """
+
+    def __init__(self, connection, interval_s: float = HOTPLUG_POLL_INTERVAL_S):
+        self.connection = connection
+        self.interval_s = interval_s
+        self.down_since: Dict[str, float] = {}   # hwid -> epoch seconds when it was lost
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def isRunning(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.isRunning():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="HotplugMonitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 2.0):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Hot-plug poll failed: {e}")
+
+    def poll(self):
+        """Compare the port list with the known devices once."""
+        present = {port_info.hwid: port_info for port_info in self.connection.backend.listPorts()}
+        for hwid, device in list(self.connection.devices_by_hwid.items()):
+            if not device.enabled:
+                continue
+            if hwid not in present:
+                if hwid not in self.down_since:
+                    self.down_since[hwid] = time.time()
+                    self.connection.dropDevice(device)
+            elif hwid in self.down_since:
+                if self.connection.restoreDevice(device, present[hwid], down_since=self.down_since[hwid]):
+                    del self.down_since[hwid]
@@ -0,0 +1,180 @@
+''' Always-on counters and latency histograms for serial I/O '''
+
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+import threading
+import numpy as np
+
+# Upper bounds (seconds) of the write latency buckets; the last bucket is everything above
+LATENCY_BUCKETS_S = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_S):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum_s": self.sum,
+            "max_s": self.max,
+            "p50_s": self.quantile(0.5),
+            "p99_s": self.quantile(0.99),
+            "buckets": {("+Inf" if i == len(self.bounds) else f"{self.bounds[i]:g}"): count
+                        for i, count in enumerate(self.counts)},
+        }
+
+
+class DeviceMetrics:
+    """
+    Serial I/O counters for one Device.
+
+    Updated from whichever thread writes to the port (normally the
+    SerialWriter), read by snapshot() from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes_written = 0
+        self.frames_written = 0
+        self.write_latency = LatencyHistogram()
+        self.out_waiting_max = 0       # High-water mark of bytes queued in the OS output buffer
+        self.errors: Counter = Counter()   # Exception type name -> count
+        self.connects = 0
+        self.reconnects = 0            # Successful connects after the first
+
+    def recordWrite(self, nbytes: int, seconds: float, frames: int = 1):
+        """Record one write call; `nbytes` is what the port accepted, `frames` the frames it completed."""
+        with self._lock:
+            self.bytes_written += nbytes
+            self.frames_written += frames
+            self.write_latency.observe(seconds)
+
+    def recordOutWaiting(self, nbytes: int):
+        if nbytes > self.out_waiting_max:
+            self.out_waiting_max = nbytes
+
+    def recordError(self, error: BaseException):
+        with self._lock:
+            self.errors[type(error).__name__] += 1
+
+    def recordConnect(self):
+        with self._lock:
+            self.connects += 1
+            if self.connects > 1:
+                self.reconnects += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "bytes_written": self.bytes_written,
+                "frames_written": self.frames_written,
+                "write_latency": self.write_latency.snapshot(),
+                "out_waiting_max": self.out_waiting_max,
+                "errors": dict(self.errors),
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+            }
+
+
+class CommitMetrics:
+    """
+    Counters for Connection commits: how often, how many valves, how long
+    under the lock, and how many times each valve actually switched.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commits = 0
+        self.valve_changes = 0
+        self.commit_latency = LatencyHistogram()
+        self.actuations = np.zeros(0, dtype=np.int64)   # Indexed by valve ID
+
+    def recordCommit(self, changes: int, seconds: float, switched: Optional[np.ndarray] = None):
+        with self._lock:
+            self.commits += 1
+            self.valve_changes += changes
+            self.commit_latency.observe(seconds)
+            if switched is not None and switched.size:
+                size = int(switched.max()) + 1
+                if size > len(self.actuations):
+                    self.actuations = np.concatenate([self.actuations, np.zeros(size - len(self.actuations), np.int64)])
+                np.add.at(self.actuations, switched, 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            valves = np.flatnonzero(self.actuations)
+            return {
+                "commits": self.commits,
+                "valve_changes": self.valve_changes,
+                "commit_latency": self.commit_latency.snapshot(),
+                "actuations_total": int(self.actuations.sum()),
+                "actuations": {int(v): int(self.actuations[v]) for v in valves},
+            }
+
+
+@contextmanager
+def periodicDump(interval_s: Optional[float], dump: Callable[[], None]):
+    """Call `dump()` every `interval_s` seconds on a daemon thread for the duration of a with-block."""
+    if not interval_s:
+        yield
+        return
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval_s):
+            try:
+                dump()
+            except Exception as e:
+                print(f"Metrics dump failed: {e}")
+
+    thread = threading.Thread(target=run, name="MetricsDump", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join(interval_s)
+
+
+def totals(device_snapshots: Dict[str, dict]) -> dict:
+    """Sum per-device snapshots into rig-wide totals."""
+    errors: Counter = Counter()
+    for snapshot in device_snapshots.values():
+        errors.update(snapshot["errors"])
+    return {
+        "bytes_written": sum(s["bytes_written"] for s in device_snapshots.values()),
+        "frames_written": sum(s["frames_written"] for s in device_snapshots.values()),
+        "write_errors": sum(errors.values()),
+        "errors": dict(errors),
+        "reconnects": sum(s["reconnects"] for s in device_snapshots.values()),
+        "out_waiting_max": max((s["out_waiting_max"] for s in device_snapshots.values()), default=0),
+        "write_latency_max_s": max((s["write_latency"]["max_s"] for s in device_snapshots.values()), default=0.0),
+    }
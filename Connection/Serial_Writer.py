@@ -0,0 +1,147 @@
+''' Background serial writer for a single valve controller board '''
+
+from serial import SerialTimeoutException
+from typing import List, Optional
+import threading
+import time
+
+STOP_MARGIN_S = 0.5   # Extra time stop() and start() allow beyond send_timeout for a frame in flight
+
+
+class SerialWriter:
+    """
+    Own all bank writes to one Device's serial port on a dedicated thread.
+
+    The queue holds at most one pending state frame: a newer state submitted
+    before the writer picks up the previous one replaces it (latest state wins),
+    so callers never block and the board always converges on the newest state.
+    """
+
+    def __init__(self, device, high_water: int = 256, send_timeout: float = 2.0, retry_delay: float = 0.002):
+        self.device = device
+        self.high_water = high_water        # Back off while out_waiting exceeds this many bytes
+        self.send_timeout = send_timeout    # Give up on a frame after this many seconds of retries
+        self.retry_delay = retry_delay
+        self._cond = threading.Condition()
+        self._pending: Optional[List[int]] = None
+        self._busy = False
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.frames_submitted = 0
+        self.frames_coalesced = 0
+        self.frames_failed = 0
+        self.retries = 0
+
+    def isRunning(self) -> bool:
+        """Check if the writer thread is accepting frames."""
+        return self._running
+
+    def start(self):
+        """
+        Start the writer thread if it is not already running.
+
+        A previous thread that is still finishing a frame after stop() is
+        waited for first, so two writers never share the port.
+        """
+        previous = self._thread
+        if previous is not None and previous is not threading.current_thread() and previous.is_alive():
+            previous.join(self.send_timeout + STOP_MARGIN_S)
+            if previous.is_alive():
+                print(f"Writer for {self.device.port_info.device if self.device.port_info else id(self.device)} "
+                      f"is still busy, not starting another")
+                return
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        name = f"SerialWriter-{self.device.port_info.device if self.device.port_info else id(self.device)}"
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 1.0):
+        """
+        Send any pending frame (waiting up to `timeout`), then stop the writer thread.
+
+        The join allows for a frame still being retried, up to send_timeout.
+        If the thread outlives even that, it is kept so start() can wait for it.
+        """
+        self.waitUntilSent(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(self.send_timeout + STOP_MARGIN_S)
+            if not self._thread.is_alive():
+                self._thread = None
+
+    def submitState(self, banks: List[int]):
+        """Queue the polarized A/B/C bytes, replacing any frame not yet sent."""
+        with self._cond:
+            if self._pending is not None:
+                self.frames_coalesced += 1
+            self._pending = list(banks)
+            self.frames_submitted += 1
+            self._cond.notify_all()
+
+    def waitUntilSent(self, timeout: Optional[float] = None) -> bool:
+        """Block until every submitted frame has been handed to the OS and drained."""
+        with self._cond:
+            idle = self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+        if idle:
+            port = self.device.serial_port
+            if port is not None and port.is_open:
+                try:
+                    port.flush()
+                except Exception as e:
+                    print(f"Flush failed on {self.device.port_info.device}: {e}")
+        return idle
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if self._pending is None:
+                    return
+                banks, self._pending = self._pending, None
+                self._busy = True
+            try:
+                frame = self.device.encodeBanks(banks)
+                if frame and not self._send(frame):
+                    self.frames_failed += 1
+                    self.device.resetBankCache()
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _send(self, data: bytes) -> bool:
+        """Write a frame, waiting out a full output buffer and retrying write timeouts and short writes."""
+        deadline = time.monotonic() + self.send_timeout
+        while True:
+            port = self.device.serial_port
+            if port is None or not port.is_open:
+                return False
+            metrics = self.device.metrics
+            try:
+                out_waiting = port.out_waiting
+                metrics.recordOutWaiting(out_waiting)
+                if out_waiting <= self.high_water:
+                    start = time.perf_counter()
+                    written = port.write(data)
+                    written = len(data) if written is None else written
+                    metrics.recordWrite(written, time.perf_counter() - start, frames=int(written == len(data)))
+                    if written == len(data):
+                        return True
+                    data = data[written:]   # Short write: the OS buffer is full, resend the tail
+            except SerialTimeoutException as e:
+                metrics.recordError(e)
+            except Exception as e:
+                metrics.recordError(e)
+                print(f"Write failed on {self.device.port_info.device}: {e}")
+                return False
+
+            if time.monotonic() >= deadline:
+                print(f"Write timed out on {self.device.port_info.device} after {self.send_timeout}s")
+                return False
+            self.retries += 1
+            time.sleep(self.retry_delay)
@@ -0,0 +1,214 @@
+''' Simulated serial backend for running the valve controller without hardware '''
+
+from serial import SerialTimeoutException
+from serial.tools.list_ports_common import ListPortInfo
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+BANK_NAMES = "ABC"
+
+
+class SimulatedBoard:
+    """
+    One virtual 24-solenoid controller board.
+
+    Decodes the byte stream the Device sends: `!A/!B/!C` + byte initializes a
+    bank, `A/B/C` + byte sets a bank's solenoid outputs (bit i = solenoid i).
+    """
+
+    def __init__(self, port: str, start_number: int = 0, polarities: Optional[List[bool]] = None):
+        self.port = port
+        self.start_number = start_number
+        self.polarities = list(polarities) if polarities is not None else [False, False, False]
+        self.banks = [0, 0, 0]                  # Raw output byte per bank as last commanded
+        self.initialized = [False, False, False]
+        self.frames: List[Tuple[float, bytes]] = []  # (perf_counter timestamp, bytes) per write
+        self.commands = 0
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def receive(self, data: bytes, timestamp: Optional[float] = None):
+        """Record one write and apply every complete command in it."""
+        with self._lock:
+            self.frames.append((time.perf_counter() if timestamp is None else timestamp, bytes(data)))
+            self._buffer += data
+            self._parse()
+
+    def _parse(self):
+        buf = self._buffer
+        while buf:
+            if buf[0] == ord("!"):
+                if len(buf) < 3:
+                    return
+                bank = BANK_NAMES.find(chr(buf[1]))
+                if bank >= 0:
+                    self.initialized[bank] = True
+                    self.banks[bank] = 0
+                    self.commands += 1
+                del buf[:3 if bank >= 0 else 1]
+            elif chr(buf[0]) in BANK_NAMES:
+                if len(buf) < 2:
+                    return
+                self.banks[BANK_NAMES.index(chr(buf[0]))] = buf[1]
+                self.commands += 1
+                del buf[:2]
+            else:
+                del buf[:1]  # Resynchronize on an unknown byte
+
+    def solenoidStates(self) -> List[bool]:
+        """Get the 24 raw solenoid outputs."""
+        return [bool(self.banks[i // 8] >> (i % 8) & 1) for i in range(24)]
+
+    def valveStates(self) -> Dict[int, bool]:
+        """Get the logical valve states after undoing the bank polarities."""
+        return {
+            self.start_number + i: state != bool(self.polarities[i // 8])
+            for i, state in enumerate(self.solenoidStates())
+        }
+
+    def clearFrames(self):
+        """Drop the recorded frame history."""
+        with self._lock:
+            self.frames.clear()
+
+
+class SimulatedSerial:
+    """
+    In-process stand-in for serial.Serial connected to a SimulatedBoard.
+
+    With `throttle` set, bytes leave at baudrate/10 bytes per second, so
+    `out_waiting` and `flush()` behave like a real UART. `stall()` makes
+    writes raise SerialTimeoutException, as a full OS buffer does with
+    write_timeout=0.
+    """
+
+    def __init__(self, board: SimulatedBoard, baudrate: int = 115200, throttle: bool = False):
+        self.board = board
+        self.port = board.port
+        self.baudrate = baudrate
+        self.throttle = throttle
+        self.is_open = True
+        self.bytes_written = 0
+        self.write_calls = 0
+        self._wire_free_at = 0.0
+        self._stalled_until = 0.0
+        self.max_write: Optional[int] = None   # Accept at most this many bytes per write, like a nearly full buffer
+
+    @property
+    def out_waiting(self) -> int:
+        if not self.throttle:
+            return 0
+        remaining = self._wire_free_at - time.perf_counter()
+        return max(0, int(remaining * self.baudrate / 10))
+
+    def stall(self, duration: float):
+        """Make writes fail with a write timeout for `duration` seconds."""
+        self._stalled_until = time.perf_counter() + duration
+
+    def write(self, data) -> int:
+        if not self.is_open:
+            raise OSError(f"{self.port} is closed")
+        now = time.perf_counter()
+        if now < self._stalled_until:
+            raise SerialTimeoutException("Write timeout")
+        data = bytes(data)
+        if self.max_write is not None:
+            data = data[:self.max_write]
+        on_wire = now
+        if self.throttle:
+            on_wire = max(now, self._wire_free_at) + len(data) * 10 / self.baudrate
+            self._wire_free_at = on_wire
+        self.board.receive(data, on_wire)
+        self.bytes_written += len(data)
+        self.write_calls += 1
+        return len(data)
+
+    def flush(self):
+        if self.throttle:
+            remaining = self._wire_free_at - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def close(self):
+        self.is_open = False
+
+
+class VirtualRig:
+    """
+    Connection backend made of simulated boards, one per entry of a port map.
+
+    Accepts the same Valve_Port_Map.json format as Connection, so a rig can be
+    described once and run headless on any machine.
+    """
+
+    def __init__(self, port_map: Dict[str, dict], baudrate: int = 115200, throttle: bool = False):
+        self.baudrate = baudrate
+        self.throttle = throttle
+        self.boards: Dict[str, SimulatedBoard] = {}
+        self.ports: Dict[str, SimulatedSerial] = {}
+        self.unplugged = set()
+        self.open_delays: Dict[str, float] = {}
+        for port, config in port_map.items():
+            if isinstance(config, dict):
+                start_number = config.get("start_number", 0)
+                polarities = config.get("polarities", [False, False, False])
+            else:
+                start_number, polarities = config, [False, False, False]
+            self.boards[port] = SimulatedBoard(port, start_number, polarities)
+
+    @classmethod
+    def fromPortMap(cls, path: str, **kwargs) -> "VirtualRig":
+        """Build a rig from a Valve_Port_Map.json file."""
+        with open(path, "r") as f:
+            return cls(json.load(f), **kwargs)
+
+    def listPorts(self) -> List[ListPortInfo]:
+        """List the plugged-in virtual ports sorted by device name."""
+        port_infos = []
+        for port in sorted(self.boards):
+            if port in self.unplugged:
+                continue
+            info = ListPortInfo(port, skip_link_detection=True)
+            info.description = f"Simulated valve controller ({port})"
+            info.hwid = f"SIM VID:PID=0000:0000 SER={os.path.basename(port)}"
+            port_infos.append(info)
+        return port_infos
+
+    def open(self, port_info: ListPortInfo) -> SimulatedSerial:
+        """Open a virtual port."""
+        port = port_info.device
+        if port not in self.boards or port in self.unplugged:
+            raise OSError(f"could not open port {port}: no such virtual board")
+        if self.open_delays.get(port):
+            time.sleep(self.open_delays[port])
+        serial_port = SimulatedSerial(self.boards[port], baudrate=self.baudrate, throttle=self.throttle)
+        self.ports[port] = serial_port
+        return serial_port
+
+    def setOpenDelay(self, port: str, seconds: float):
+        """Make opening a port block for `seconds`, like a hung USB-serial adapter."""
+        self.open_delays[port] = seconds
+
+    def unplug(self, port: str):
+        """Simulate a board dropping off the USB bus."""
+        self.unplugged.add(port)
+        if port in self.ports:
+            self.ports[port].close()
+
+    def plug(self, port: str):
+        """Simulate a board coming back on the USB bus, powered up with all outputs off."""
+        self.unplugged.discard(port)
+        board = self.boards.get(port)
+        if board:
+            board.banks = [0, 0, 0]
+            board.initialized = [False, False, False]
+
+    def valveStates(self) -> Dict[int, bool]:
+        """Get the logical state of every valve as decoded by the boards."""
+        states = {}
+        for board in self.boards.values():
+            states.update(board.valveStates())
+        return states
@@ -0,0 +1,90 @@
+''' Array-backed valve state storage for the Connection '''
+
+from typing import Dict, Iterable, Union
+import numpy as np
+
+
+class ValveStateStore:
+    """
+    Commanded valve states held in a NumPy bool vector indexed by valve ID.
+
+    Replaces the Dict[int, bool] map: single lookups stay O(1), bulk updates
+    take ID arrays or masks, and a board's 3-byte payload is one slice + packbits.
+    """
+
+    def __init__(self, size: int = 0):
+        self._states = np.zeros(size, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __getitem__(self, number: int) -> bool:
+        return self.get(number)
+
+    def __setitem__(self, number: int, state: bool):
+        self.setMany([number], state)
+
+    def ensureSize(self, size: int):
+        """Grow the vector so valve IDs below `size` are addressable."""
+        if size > len(self._states):
+            grown = np.zeros(size, dtype=bool)
+            grown[:len(self._states)] = self._states
+            self._states = grown
+
+    def get(self, number: int, default: bool = False) -> bool:
+        """Get the state of a specific valve, or `default` if it is out of range."""
+        if 0 <= number < len(self._states):
+            return bool(self._states[number])
+        return default
+
+    def getMany(self, ids: Iterable[int]) -> np.ndarray:
+        """Get the states of several valves as a bool array."""
+        ids = np.asarray(ids, dtype=np.intp)
+        result = np.zeros(len(ids), dtype=bool)
+        valid = (ids >= 0) & (ids < len(self._states))
+        result[valid] = self._states[ids[valid]]
+        return result
+
+    def setMany(self, ids: Iterable[int], states: Union[bool, Iterable[bool]]):
+        """Set several valves at once; `states` is a scalar or one value per ID."""
+        ids = np.asarray(ids, dtype=np.intp)
+        if ids.size == 0:
+            return
+        self.ensureSize(int(ids.max()) + 1)
+        self._states[ids] = np.asarray(states, dtype=bool)
+
+    def setMask(self, mask: np.ndarray, states: Union[bool, np.ndarray]):
+        """Set every valve selected by a bool mask over valve IDs."""
+        mask = np.asarray(mask, dtype=bool)
+        self.ensureSize(len(mask))
+        target = self._states[:len(mask)]
+        target[mask] = states if np.isscalar(states) else np.asarray(states, dtype=bool)[mask]
+
+    def update(self, state_dict: Dict[int, bool]):
+        """Set valves from a {valve_id: state} dictionary."""
+        if state_dict:
+            self.setMany(list(state_dict.keys()), list(state_dict.values()))
+
+    def setRange(self, start: int, count: int, state: bool):
+        """Set a contiguous block of valve IDs, e.g. one board's 24 solenoids."""
+        self.ensureSize(start + count)
+        self._states[start:start + count] = state
+
+    def getRange(self, start: int, count: int) -> np.ndarray:
+        """Get a copy of a contiguous block of valve states, padded with False."""
+        block = np.zeros(count, dtype=bool)
+        available = self._states[start:start + count]
+        block[:len(available)] = available
+        return block
+
+    def packBanks(self, start: int, polarity_mask: np.ndarray) -> np.ndarray:
+        """Pack one board's 24 states, XOR its polarity, into the A/B/C bytes (LSB first)."""
+        return np.packbits(self.getRange(start, 24) ^ polarity_mask, bitorder="little")
+
+    def toArray(self) -> np.ndarray:
+        """Get a copy of the full state vector."""
+        return self._states.copy()
+
+    def toDict(self) -> Dict[int, bool]:
+        """Get the open valves as a {valve_id: True} dictionary."""
+        return {int(number): True for number in np.flatnonzero(self._states)}
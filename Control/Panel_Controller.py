@@ -4,6 +4,7 @@ from multiprocessing import connection
 from PySide6.QtWidgets import QPushButton, QApplication
 from PySide6.QtGui import QColor
 from PySide6.QtCore import QRunnable, QThreadPool, Slot, QTimer
+import threading
 import traceback
 from typing import Dict, List
 import json
@@ -16,6 +17,9 @@ except NameError:
 sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
 from Connection.Connection import Connection
 
+VALVE_BUTTON_NAME = "valveButton"   # Object name shared by every valve button, used as the stylesheet selector
+REFRESH_INTERVAL_MS = 33            # Valve button refresh period (~30 Hz)
+
 
 class ValveController:
     def __init__(self, valve_panel=None, logger=None, control_box: Connection = None):
@@ -26,57 +30,91 @@ class ValveController:
         self.valve_panel = valve_panel
         self.logger = logger
         self.control_box = control_box
-        self.control_box.valveStateChanged.connect(self.updateButtonState)
+
+        # Latest state per valve since the last refresh; written from any thread
+        self._pending: Dict[int, bool] = {}
+        self._pending_lock = threading.Lock()
+        self.refresh_timer = QTimer()
+        self.refresh_timer.timeout.connect(self.refreshButtons)
+        self.refresh_timer.start(REFRESH_INTERVAL_MS)
+
+        self.control_box.valveStatesChanged.connect(self.updateButtonStates)
+
+    def buttonStyleSheet(self) -> str:
+        """
+        Stylesheet for all valve buttons, set once on the panel.
+
+        Open/closed colors follow the :checked pseudo-state, so toggling a
+        button never re-parses a stylesheet.
+        """
+        return (
+            f"QPushButton#{VALVE_BUTTON_NAME} {{ color: black; background-color: {self.btn_off_color}; }}\n"
+            f"QPushButton#{VALVE_BUTTON_NAME}:checked {{ background-color: {self.btn_on_color}; }}"
+        )
+
+    @staticmethod
+    def setButtonLabel(button: QPushButton, valve_id: int, state: bool):
+        text = f"{valve_id} - {'OPEN' if state else 'CLOSE'}"
+        if button.text() != text:
+            button.setText(text)
+
+    @Slot(object)
+    def updateButtonStates(self, states: Dict[int, bool]):
+        """Record one aggregated valve change notification; safe from any thread."""
+        with self._pending_lock:
+            self._pending.update(states)
 
     @Slot(int, bool)
     def updateButtonState(self, valve_id: int, state: bool):
-        """Safely update valve button visuals from any thread."""
-        def apply_update():
+        """Record a valve change; the button is repainted on the next refresh."""
+        with self._pending_lock:
+            self._pending[valve_id] = state
+
+    def refreshButtons(self):
+        """Apply the latest state of every valve that changed since the last refresh (GUI thread)."""
+        if not self._pending:
+            return
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+
+        for valve_id, state in pending.items():
             button = self.buttons.get(valve_id)
             if not button:
-                return
-            
+                continue
             if button.isChecked() != state:
                 button.blockSignals(True)
                 button.setChecked(state)
                 button.blockSignals(False)
-
-            label = "OPEN" if state else "CLOSE"
-            color = self.btn_on_color if state else self.btn_off_color
-            button.setText(f"{valve_id} - {label}")
-            button.setStyleSheet(f"color: black; background-color: {color};")
-
-        QTimer.singleShot(0, apply_update)  # Schedule update on the main thread
+            self.setButtonLabel(button, valve_id, state)
 
     def valveToggle(self, button: QPushButton, user_triggered: bool = True):
         """Handle individual valve toggle."""
         is_on = button.isChecked()
         state = "OPEN" if is_on else "CLOSE"
-        color = self.btn_on_color if is_on else self.btn_off_color
 
         valve_id = button.property("valve_id")
-        button.setText(f"{valve_id} - {state}")
-        button.setStyleSheet(f"color: black; background-color: {color};")
+        self.setButtonLabel(button, valve_id, is_on)
 
         msg = f"Valve {valve_id} {state}"
     
         if self.control_box:
             self.control_box.setValveState(valve_id, is_on)
-            self.control_box.flush()
         else:
             print("ControlBox not connected or not available.")
 
     def valveOnAll(self):
         """Turn on all valves by toggling all buttons on."""
-        for btn in self.buttons.values():
-            if btn.isVisible() and btn.isEnabled() and not btn.isChecked():
-                btn.setChecked(True)
+        with self.control_box.batch():
+            for btn in self.buttons.values():
+                if btn.isVisible() and btn.isEnabled() and not btn.isChecked():
+                    btn.setChecked(True)
 
     def valveOffAll(self):
         """Turn off all valves by toggling all buttons off."""
-        for btn in self.buttons.values():
-            if btn.isVisible() and btn.isEnabled() and btn.isChecked():
-                btn.setChecked(False)
+        with self.control_box.batch():
+            for btn in self.buttons.values():
+                if btn.isVisible() and btn.isEnabled() and btn.isChecked():
+                    btn.setChecked(False)
 
 # Not used in the current context, but kept for potential future use
 class PumpController:
@@ -0,0 +1,652 @@
+""" 
+This script is designed to run a specific experiment for the CCC5P2 project.
+
+Program flow:
+
+"""
+
+import json
+import time
+import datetime
+import numpy as np
+from threading import Event
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+import sys
+import os
+import traceback
+
+try:
+    BASE_DIR = os.path.dirname(__file__)
+except NameError:
+    BASE_DIR = os.getcwd()
+
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+from Connection.Connection_Core import ConnectionCore
+from Experiment_Config import (
+    EXPERIMENT_NAME,
+    EXPERIMENT_TOTAL_TIME,
+    EXPERIMENT_CONFIG,
+    INPUT_TO_CONTROL_MAP,
+    VALVE_ID,
+    EXPERIMENT_TIMING_CONFIG,
+    TEST_MODE,
+    MUX_CONFIG,
+    offset_schedule
+)
+from Experiment.Mux_Decoder import MuxDecoder
+from Experiment.Scheduler import MonotonicScheduler
+from Experiment.Frame_Program import (
+    TEST_MODE_TIME_DIVISOR,
+    FrameProgram,
+    compileProgram,
+    compareProgram,
+    cycleDuration,
+    executeProgram
+)
+from Experiment.Schedule_Analysis import analyzeSchedule, matrixColumns, planStreamOffsets
+from Experiment.Event_Log import EventLog, newRunId, runLogPath
+from Connection.Serial_Metrics import periodicDump
+from Experiment.Metrics_Server import RunStatus
+from Experiment.Checkpoint import (
+    isResumable,
+    loadCheckpoint,
+    originMonotonic,
+    saveCheckpoint,
+    selectResumeFeeds
+)
+
+LOG_DIR = os.path.join(BASE_DIR, 'logs')
+EXPERIMENT_LOG_NAME = 'CCC5p2_ExpLog'
+CHECKPOINT_PATH = os.path.join(BASE_DIR, 'CCC5p2_Checkpoint.json')
+
+# Structured row layout of the experiment matrix: [time_min, valve_number, row, column, side, _]
+MATRIX_DTYPE = np.dtype([
+    ("time", "f8"),
+    ("valve", "i4"),
+    ("row", "i4"),
+    ("col", "i4"),
+    ("side", "i4"),
+    ("_", "i4"),
+])
+
+def generateExperimentArray(time_scale=1.0, config=None, offsets: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Build the experiment matrix as a MATRIX_DTYPE structured array sorted by time.
+
+    Each config block is expanded by broadcasting its intervals against its
+    columns, then all blocks are ordered with one stable O(n log n) sort, so
+    entries with equal times keep the block → column → interval order.
+    `offsets` (minutes, one per feed stream, e.g. from planExperimentOffsets)
+    replaces offset_schedule.
+    """
+    config = EXPERIMENT_CONFIG if config is None else config
+    side = 2
+    offset_num = 0
+    blocks = []
+
+    for block in config:
+        row = block["row"]
+        column_to_input = block["column_to_input"]
+
+        intervals = block.get("intervals", [block.get("interval")])
+        if not isinstance(intervals, list):
+            raise TypeError(f"'intervals' must be a list: {block}")
+        for interval in intervals:
+            if not isinstance(interval, (int, float)):
+                raise TypeError(f"Interval must be int/float: {interval}")
+
+        columns = [
+            (col, INPUT_TO_CONTROL_MAP[input_idx]["valve"])
+            for col, input_idx in column_to_input.items()
+            if INPUT_TO_CONTROL_MAP.get(input_idx)
+        ]
+        if not columns or not intervals:
+            offset_num += len(columns)
+            continue
+
+        cols = np.array([col for col, _ in columns], dtype=np.int32)
+        valves = np.array([valve for _, valve in columns], dtype=np.int32)
+        stream_offsets = np.array([
+            offsets[offset_num + k] if offsets is not None else offset_schedule(offset_num + k)
+            for k in range(len(columns))
+        ], dtype=np.float64)
+        times = (np.asarray(intervals, dtype=np.float64)[None, :] + stream_offsets[:, None]) * time_scale
+
+        expanded = np.zeros(times.size, dtype=MATRIX_DTYPE)
+        expanded["time"] = times.ravel()
+        expanded["valve"] = np.repeat(valves, len(intervals))
+        expanded["row"] = row
+        expanded["col"] = np.repeat(cols, len(intervals))
+        expanded["side"] = side
+        blocks.append(expanded)
+        offset_num += len(columns)
+
+    if not blocks:
+        return np.zeros(0, dtype=MATRIX_DTYPE)
+    matrix = np.concatenate(blocks)
+    return matrix[np.argsort(matrix["time"], kind="stable")]
+
+def matrixToList(matrix: np.ndarray) -> List[List]:
+    """View a structured experiment matrix as the [time, valve, row, col, side, _] list-of-lists."""
+    return [list(entry) for entry in matrix.tolist()]
+
+def generateExperimentMatrix(time_scale=1.0, offsets: Optional[Sequence[float]] = None) -> List[List[int]]:
+    # Each entry: [time_min, valve_number, row, column, side, _]
+    return matrixToList(generateExperimentArray(time_scale=time_scale, offsets=offsets))
+
+def experimentStreams(config=None) -> List[List[float]]:
+    """Planned feed times (minutes, before offsets) per stream, indexed like offset_schedule."""
+    config = EXPERIMENT_CONFIG if config is None else config
+    streams = []
+    for block in config:
+        intervals = block.get("intervals", [block.get("interval")])
+        for input_idx in block["column_to_input"].values():
+            if INPUT_TO_CONTROL_MAP.get(input_idx):
+                streams.append(list(intervals))
+    return streams
+
+def planExperimentOffsets(config=None, timing: Optional[dict] = None, resolution_min: float = 0.5,
+                          max_offset_min: Optional[float] = None) -> List[float]:
+    """
+    Pick per-stream offsets (minutes) that keep feeds close to the times EXPERIMENT_CONFIG intends.
+
+    Pass the result to generateExperimentMatrix(offsets=...) and check it with
+    analyzeExperimentSchedule(..., offsets=...).
+    """
+    cycle_s = cycleDuration(timing or EXPERIMENT_TIMING_CONFIG)
+    return planStreamOffsets(experimentStreams(config), cycle_s, resolution_min=resolution_min,
+                             max_offset_min=max_offset_min)
+
+def intendedExperimentTimes(matrix_mat, offsets: Optional[Sequence[float]] = None, time_scale=1.0,
+                            config=None) -> np.ndarray:
+    """
+    Time each entry of a generated matrix was meant for, with its stream offset taken back out.
+
+    `offsets` and `time_scale` must be the ones the matrix was generated
+    with (None: offset_schedule). Entries of wells not in the config keep
+    their matrix time.
+    """
+    config = EXPERIMENT_CONFIG if config is None else config
+    shift = {}
+    offset_num = 0
+    for block in config:
+        for col, input_idx in block["column_to_input"].items():
+            if INPUT_TO_CONTROL_MAP.get(input_idx):
+                offset = offsets[offset_num] if offsets is not None else offset_schedule(offset_num)
+                shift[(block["row"], col)] = offset * time_scale
+                offset_num += 1
+    times, rows, cols = matrixColumns(matrix_mat)
+    return times - np.array([shift.get((int(r), int(c)), 0.0) for r, c in zip(rows, cols)], dtype=np.float64)
+
+def analyzeExperimentSchedule(matrix_mat, timing: Optional[dict] = None, test_mode=False,
+                              offsets: Optional[Sequence[float]] = None, time_scale=1.0) -> dict:
+    """
+    Realized lateness, per-well intervals and total overrun of a matrix with sequential cycles.
+
+    Lateness is also measured against the intended (unshifted) times, see
+    intendedExperimentTimes.
+    """
+    step_scale = 1 / TEST_MODE_TIME_DIVISOR if test_mode else 1
+    cycle_s = cycleDuration(timing or EXPERIMENT_TIMING_CONFIG) * step_scale
+    intended = intendedExperimentTimes(matrix_mat, offsets=offsets, time_scale=time_scale)
+    return analyzeSchedule(matrix_mat, cycle_s, unit_s=1 if test_mode else 60, intended=intended)
+
+@lru_cache(maxsize=None)
+def getMuxDecoder(mux_valves: Tuple[int, ...]) -> MuxDecoder:
+    """Get the decoder for a MUX valve list, built once and reused."""
+    if list(mux_valves) == list(MUX_CONFIG["valves"]):
+        return MuxDecoder.fromConfig(MUX_CONFIG)
+    return MuxDecoder.binaryTree(mux_valves, 2 ** (len(mux_valves) // 2))
+
+def setMuxValves(connection, mux_valves, column_index, scr_update=print, label=""):
+    """
+    Set MUX valves for CCC5P2 (1–16).
+
+    mux_valves: [26, 23, 22, 21, 20, 19, 18, 17]  # ordered list of MUX valve IDs
+    column_index: 1–16 (column number), or 98 (all open), 99 (all closed)
+    """
+    try:
+        decoder = getMuxDecoder(tuple(mux_valves))
+    except ValueError as e:
+        scr_update(f"Error: {e}")
+        return
+
+    try:
+        column_index = int(column_index)
+    except (TypeError, ValueError):
+        scr_update(f"Invalid mux setting for column index (non-integer): {column_index}")
+        return
+
+    if not decoder.isValidColumn(column_index):
+        scr_update(f"Invalid mux setting for column index: {column_index}")
+        return
+
+    decoder.apply(connection, column_index)
+    scr_update(f"MUX set for column {column_index}")
+
+def compileExperimentProgram(matrix_mat: List[List[int]], delay_min=60, bypass_on=False, test_mode=False,
+                             timing: Optional[dict] = None, overlap=False,
+                             coalesce_window: Optional[float] = None,
+                             optimize_window: Optional[float] = None) -> FrameProgram:
+    """
+    Compile the matrix into the frames runExperimentMatrix will send.
+
+    Use it for a dry run: program.summary() gives the run duration and valve
+    activation count, program.trace() every frame, without touching hardware.
+    With overlap=True, cycles whose valve footprints are disjoint may run
+    concurrently; coalesce_window (minutes) merges same-input, same-column
+    feeds across rows into one cycle; optimize_window (minutes) reorders
+    cycles to reuse primed lines and cut MUX transitions.
+    """
+    return compileProgram(
+        matrix_mat, VALVE_ID, timing or EXPERIMENT_TIMING_CONFIG, getMuxDecoder(tuple(VALVE_ID["mux"])),
+        delay_min=delay_min, bypass_on=bypass_on, test_mode=test_mode, overlap=overlap,
+        coalesce_window=coalesce_window, optimize_window=optimize_window
+    )
+
+# Protocol steps that (re)select the MUX column, logged as in the step-by-step protocol
+MUX_LOG_STEPS = ("Prefill pathways", "Feed chambers", "Clean pathways")
+
+def runExperimentMatrix(
+    connection: ConnectionCore,
+    matrix_mat: List[List[int]],
+    delay_min=60,
+    bypass_on=False,
+    test_mode=False,
+    log_fn: Callable[[str], None] = print,
+    scheduler: Optional[MonotonicScheduler] = None,
+    timing: Optional[dict] = None,
+    overlap=False,
+    coalesce_window: Optional[float] = None,
+    optimize_window: Optional[float] = None,
+    log_path: Optional[str] = None,
+    run_id: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    matrix_path: Optional[str] = None,
+    resume: Optional[dict] = None,
+    missed_policy: str = "skip",
+    metrics_interval_s: Optional[float] = None,
+    status: Optional[RunStatus] = None,
+    stop_event: Optional[Event] = None
+):
+    """
+    Run the matrix on a Connection and return its metadata and feed log.
+
+    If `stop_event` fires, no further cycle starts: the cycle in progress
+    runs to the end of its purge, then all valves are closed. The metadata
+    then has "stopped" set and "next_feed" is where a resume would pick up.
+
+    With `checkpoint_path`, a checkpoint is saved atomically after every
+    completed cycle. Passing a loaded checkpoint as `resume` continues that
+    run on its original schedule origin: the last commanded valve state is
+    restored in one frame and cycles missed while the run was down are
+    handled by `missed_policy` (see selectResumeFeeds).
+    """
+    log = []
+    if resume:
+        run_id, log_path = resume["run_id"], resume["log_path"]
+    if scheduler is None:
+        scheduler = MonotonicScheduler(origin=originMonotonic(resume) if resume else None, stop_event=stop_event)
+    start_time = scheduler.wall_origin
+    program = compileExperimentProgram(matrix_mat, delay_min, bypass_on, test_mode, timing, overlap,
+                                       coalesce_window, optimize_window)
+    total_feeds = len(program.feeds)
+    position = {id(feed): n for n, feed in enumerate(program.feeds)}
+    options = {
+        "delay_min": delay_min, "bypass_on": bypass_on, "test_mode": test_mode, "timing": timing,
+        "overlap": overlap, "coalesce_window": coalesce_window, "optimize_window": optimize_window,
+    }
+    for entry_index, reason in program.skipped:
+        log_fn(f"[WARNING] Entry {entry_index}: {reason}")
+    if coalesce_window is not None:
+        log_fn(f"Coalesced {sum(len(f.wells) for f in program.feeds)} feeds into {len(program.feeds)} cycles")
+    if optimize_window is not None:
+        baseline = compileExperimentProgram(matrix_mat, delay_min, bypass_on, test_mode, timing, overlap,
+                                            coalesce_window)
+        saved = compareProgram(baseline, program)
+        log_fn(f"Feed order optimized: {saved['busy_time_saved_s'] / 60:.1f} min of protocol time and "
+               f"{saved['actuations_saved']} valve actuations saved")
+    if overlap:
+        sequential = compileExperimentProgram(matrix_mat, delay_min, bypass_on, test_mode, timing,
+                                              coalesce_window=coalesce_window, optimize_window=optimize_window)
+        log_fn(f"Overlapped schedule: {program.duration_s / 60:.1f} min "
+               f"(sequential {sequential.duration_s / 60:.1f} min)")
+
+    run_id = run_id or newRunId()
+    log_path = log_path or runLogPath(LOG_DIR, EXPERIMENT_LOG_NAME, run_id)
+    metadata = {
+        "run_id": run_id,
+        "experiment_name": EXPERIMENT_NAME,
+        "experiment_total_time_min": EXPERIMENT_TOTAL_TIME,
+        "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        "delay_min": delay_min,
+        "bypass_on": bypass_on,
+        "overlap": overlap,
+        "coalesce_window": coalesce_window,
+        "optimize_window": optimize_window,
+        "test_mode": test_mode,
+        "planned_feeds": sum(len(feed.wells) for feed in program.feeds),
+        "planned_duration_s": program.duration_s,
+    }
+    log_fn(f"Logging run {run_id} to {log_path}")
+
+    def checkpoint(next_feed: int, complete=False):
+        if not checkpoint_path:
+            return
+        saveCheckpoint(checkpoint_path, {
+            "run_id": run_id,
+            "log_path": log_path,
+            "matrix_path": matrix_path,
+            "origin_epoch": scheduler.wall_origin.timestamp(),
+            "next_feed": next_feed,
+            "next_entry": program_feeds[next_feed].entry_index if next_feed < total_feeds else None,
+            "total_feeds": total_feeds,
+            "open_valves": [int(v) for v in program.ids if connection.getValveState(int(v))],
+            "options": options,
+            "complete": complete,
+            "saved_at": time.time(),
+        })
+
+    program_feeds = program.feeds
+    if resume:
+        if resume["total_feeds"] != total_feeds:
+            raise ValueError(f"Checkpoint expects {resume['total_feeds']} feed cycles, this matrix compiles to {total_feeds}")
+        feeds = selectResumeFeeds(program.feeds[resume["next_feed"]:], scheduler.elapsed(), missed_policy)
+        missed = total_feeds - resume["next_feed"] - len(feeds)
+        open_valves = set(resume["open_valves"])
+        connection.apply({int(v): int(v) in open_valves for v in program.ids})
+        program = FrameProgram(program.ids, feeds, program.skipped, overlap=overlap)
+        log_fn(f"Resuming run {run_id} at cycle {resume['next_feed']} of {total_feeds} "
+               f"({missed} missed cycles dropped, policy '{missed_policy}')")
+        if feeds and feeds[0].frames[0].label != "Prefill pathways":
+            log_fn("[WARNING] First resumed cycle expects a primed input line; it was idle during the outage")
+
+    def log_device(event, device, fields):
+        # a board dropped off the USB bus or came back (see HotplugMonitor)
+        event_log.write(event, **fields)
+        if event == "device_lost":
+            log_fn(f"[WARNING] {fields['port']} lost (valves {fields['valves'][0]}-{fields['valves'][1]})")
+        else:
+            log_fn(f"{fields['port']} reconnected after {fields.get('outage_s', 0):.1f} s, valve state replayed")
+
+    def dump_metrics():
+        event_log.write("io_metrics", t_s=scheduler.elapsed(), **connection.metricsSnapshot())
+
+    status = status if status is not None else RunStatus()
+    done = resume["next_feed"] if resume else 0
+    status.begin(run_id, total_feeds, scheduler.wall_origin.timestamp(), program.duration_s,
+                 feeds_done=done, feeds_dropped=total_feeds - done - len(program.feeds))
+
+    with EventLog(log_path, run_id=run_id) as event_log, connection.deviceListener(log_device), \
+            periodicDump(metrics_interval_s, dump_metrics):
+        if resume:
+            event_log.write("resume", next_feed=resume["next_feed"], policy=missed_policy,
+                            dropped=missed, restored_valves=sorted(open_valves))
+        else:
+            event_log.write("run_start", **metadata)
+            event_log.setSummary(**metadata)
+            checkpoint(0)
+        for entry_index, reason in program.skipped:
+            event_log.write("skipped", entry=entry_index, reason=reason)
+
+        def log_frame(feed, frame):
+            status.enterFeed(feed.entry_index, feed.col, feed.planned_s)
+            # arrays are serialized by the log writer thread, not here
+            event_log.write("frame", entry=feed.entry_index, col=feed.col, step=frame.label,
+                            t_s=scheduler.elapsed(), valves=frame.ids, states=frame.states)
+            if frame.label in MUX_LOG_STEPS:
+                log_fn(f"{frame.label} → MUX set for column {feed.col}")
+
+        # each feed cycle is a precompiled list of frames, sent at monotonic deadlines
+        # a coalesced cycle still gets one log entry per well, timed against that well's own entry
+        next_feed = done
+        for feed, record in executeProgram(connection, program, scheduler, on_frame=log_frame):
+            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for entry_index, row, side, planned_s in feed.wells:
+                log_entry = {
+                    "type": "feed",
+                    "entry": entry_index,
+                    "valve": feed.input_valve,
+                    "row": row,
+                    "col": feed.col,
+                    "side": side,
+                    "timestamp": timestamp,
+                    "planned_time": scheduler.wallTime(planned_s).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+                    "start_time": record["actual_time"],
+                    "lateness_s": round(record["actual_s"] - planned_s, 3)   # Negative: fed early with its group
+                }
+                log.append(log_entry)
+                event_log.write("feed", **{k: v for k, v in log_entry.items() if k != "type"})
+                log_fn(f"{timestamp} → Feed Input Valve {feed.input_valve} → Row {row}, Column {feed.col}, Side {side}")
+            status.feedDone(record["lateness_s"])
+            next_feed = position[id(feed)] + 1
+            checkpoint(next_feed)
+
+        stopped = scheduler.isStopped() and next_feed < total_feeds
+        end_time = datetime.datetime.now()
+        summary = {
+            "end_time": end_time.strftime('%Y-%m-%d %H:%M:%S'),
+            "duration_min": (end_time - start_time).total_seconds() / 60,
+            "num_feeds": len(log),
+            "stopped": stopped,
+            "next_feed": next_feed,
+            "total_feeds": total_feeds,
+            "schedule": scheduler.summary(),
+        }
+        dump_metrics()
+        event_log.write("run_end", **summary)
+        event_log.setSummary(**summary)
+        status.finish(stopped=stopped)
+        if not stopped:
+            checkpoint(total_feeds, complete=True)
+
+    if stopped:
+        log_fn(f"Experiment stopped at cycle {next_feed} of {total_feeds}. Closing all valves...")
+    else:
+        log_fn("Experiment completed. Closing all valves...")
+    
+    all_valves = set(VALVE_ID["mux"]) \
+    | {VALVE_ID["purge"], VALVE_ID["fresh"], VALVE_ID["muxIn"]} \
+    | set(VALVE_ID["bypass"].values()) \
+    | {v for pair in VALVE_ID["chamberIn"].values() for v in pair}
+
+    # outlet
+    if VALVE_ID.get("outlet", 0):
+        all_valves.add(VALVE_ID["outlet"])
+
+    connection.setValveStates({vid: False for vid in all_valves})
+    connection.waitForWrites(timeout=5.0)
+
+    return {
+        "metadata": {**metadata, **summary, "log_path": log_path},
+        "expLog": log
+    }
+
+
+def saveExperimentMatrixToJson(filename: str, matrix: List[List[int]]):
+    """Save the experiment matrix to a JSON file."""
+    with open(filename, 'w') as f:
+        f.write('{\n  "matrix": [\n')
+        for i, row in enumerate(matrix):
+            line = '    ' + json.dumps(row)
+            if i < len(matrix) - 1:
+                line += ','
+            f.write(line + '\n')
+        f.write('  ]\n}')
+    print(f"Saved experiment matrix to {filename}")
+
+def loadExperimentMatrixFromJson(filename: str) -> List[List[int]]:
+    """Load the experiment matrix from a JSON file."""
+    with open(filename, 'r') as f:
+        data = json.load(f)
+        return data.get('matrix', [])
+
+def runFromGui(gui, delay_min: float = 0, test_mode: bool = False, time_scale: float = 1.0):
+    try:
+        if gui.experiment_runner and gui.experiment_runner.isRunning():
+            gui.logMessage("Experiment is already running.")
+            return
+
+        gui.logMessage("Starting experiment in background...")
+        runner = ExperimentRunner(gui, delay_min=delay_min, test_mode=TEST_MODE, time_scale=time_scale)
+    except Exception as e:
+        tb = traceback.format_exc()
+        gui.logMessage(f"Error running experiment: {e}")
+        gui.logMessage(tb)
+        print(tb)
+
+def runExperiment(connection: ConnectionCore, log_fn: Callable[[str], None] = print, delay_min=0, test_mode=False,
+                  time_scale=1.0, plan_offsets=False, overlap=False, coalesce_window=None, optimize_window=None,
+                  matrix_path: Optional[str] = None, checkpoint_path: Optional[str] = CHECKPOINT_PATH,
+                  log_path: Optional[str] = None, metrics_interval_s=None, status: Optional[RunStatus] = None,
+                  stop_event: Optional[Event] = None):
+    """Generate the CCC5P2 matrix, check its schedule, save it and run it."""
+    offsets = planExperimentOffsets() if plan_offsets else None
+    expMatrix = generateExperimentMatrix(time_scale=time_scale, offsets=offsets)
+    report = analyzeExperimentSchedule(expMatrix, test_mode=test_mode, offsets=offsets, time_scale=time_scale)
+    log_fn(
+        f"Schedule check: max lateness {report['max_intended_lateness_s'] / 60:.1f} min, "
+        f"{report['late_intended_feeds']} late feeds, overrun {report['intended_overrun_s'] / 60:.1f} min "
+        f"(against the intended times)"
+    )
+    matrix_path = matrix_path or os.path.join(BASE_DIR, 'CCC5p2_ExpMatrix.json')
+    saveExperimentMatrixToJson(matrix_path, expMatrix)
+    return runExperimentMatrix(
+        connection, expMatrix,
+        delay_min=delay_min,
+        bypass_on=False,
+        test_mode=test_mode,
+        log_fn=log_fn,
+        overlap=overlap,
+        coalesce_window=coalesce_window,
+        optimize_window=optimize_window,
+        log_path=log_path,
+        checkpoint_path=checkpoint_path,
+        matrix_path=matrix_path,
+        metrics_interval_s=metrics_interval_s,
+        status=status,
+        stop_event=stop_event,
+    )
+
+
+def resumeExperiment(connection: ConnectionCore, checkpoint_path: str = CHECKPOINT_PATH,
+                     log_fn: Callable[[str], None] = print, missed_policy="skip", metrics_interval_s=None,
+                     status: Optional[RunStatus] = None, stop_event: Optional[Event] = None):
+    """Continue the run recorded in a checkpoint file on its original schedule; None if there is nothing to resume."""
+    checkpoint = loadCheckpoint(checkpoint_path)
+    if not isResumable(checkpoint):
+        log_fn(f"Nothing to resume in {checkpoint_path}")
+        return None
+    expMatrix = loadExperimentMatrixFromJson(checkpoint["matrix_path"])
+    return runExperimentMatrix(
+        connection, expMatrix,
+        log_fn=log_fn,
+        checkpoint_path=checkpoint_path,
+        matrix_path=checkpoint["matrix_path"],
+        resume=checkpoint,
+        missed_policy=missed_policy,
+        metrics_interval_s=metrics_interval_s,
+        status=status,
+        stop_event=stop_event,
+        **checkpoint["options"],
+    )
+
+
+class ExperimentRunner:
+    """Runs the experiment for the GUI; start it with QThreadPool.globalInstance().start(runner.run)."""
+
+    def __init__(self, gui, delay_min=0, test_mode=False, time_scale=1.0, plan_offsets=False, overlap=False,
+                 coalesce_window=None, optimize_window=None, resume_from=None, missed_policy="skip",
+                 metrics_interval_s=None):
+        self.gui = gui
+        self.delay_min = delay_min
+        self.test_mode = test_mode
+        self.time_scale = time_scale
+        self.plan_offsets = plan_offsets
+        self.overlap = overlap
+        self.coalesce_window = coalesce_window
+        self.optimize_window = optimize_window
+        self.resume_from = resume_from          # Checkpoint file of an interrupted run to continue
+        self.missed_policy = missed_policy
+        self.metrics_interval_s = metrics_interval_s   # Serial I/O counters to the run log this often
+        self._pause_event = Event()
+        self._pause_event.set()
+        self._stop_event = Event()
+        self._is_running = True
+
+    def run(self):
+        # self.gui.logMessage("[DEBUG] ExperimentRunner.run() called")
+        try:
+            if self.resume_from:
+                self.resumeRun()
+                return
+            expResults = runExperiment(
+                self.gui.control_box,
+                log_fn=self.gui.logMessage,
+                delay_min=self.delay_min,
+                test_mode=self.test_mode,
+                time_scale=self.time_scale,
+                plan_offsets=self.plan_offsets,
+                overlap=self.overlap,
+                coalesce_window=self.coalesce_window,
+                optimize_window=self.optimize_window,
+                metrics_interval_s=self.metrics_interval_s,
+                status=getattr(self.gui, "run_status", None),
+                stop_event=self._stop_event,
+            )
+            # with open('CCC5p2_ExpLog.json', 'w') as f:
+            #     json.dump(expResults, f, indent=2)
+            self.logOutcome(expResults)
+
+        except Exception as e:
+            tb = traceback.format_exc()
+            self.gui.logMessage(f"Experiment failed: {e}")
+            self.gui.logMessage(tb)
+        finally:
+            self._is_running = False
+
+    def resumeRun(self):
+        """Continue the run recorded in the checkpoint file on its original schedule."""
+        expResults = resumeExperiment(
+            self.gui.control_box,
+            checkpoint_path=self.resume_from,
+            log_fn=self.gui.logMessage,
+            missed_policy=self.missed_policy,
+            metrics_interval_s=self.metrics_interval_s,
+            status=getattr(self.gui, "run_status", None),
+            stop_event=self._stop_event,
+        )
+        if expResults is not None:
+            self.logOutcome(expResults)
+
+    def logOutcome(self, expResults):
+        metadata = expResults["metadata"]
+        if metadata["stopped"]:
+            self.gui.logMessage(f"Experiment stopped at cycle {metadata['next_feed']} of {metadata['total_feeds']}.")
+        else:
+            self.gui.logMessage("Experiment completed.")
+
+    def stop(self): self._stop_event.set()
+    def pause(self): self._pause_event.clear()
+    def resume(self): self._pause_event.set()
+    def is_paused(self): return not self._pause_event.is_set()
+    def isRunning(self): return self._is_running
+
+def main():
+    test_mode = TEST_MODE
+    time_scale = 1/100 if test_mode else 1.0
+    expMatrix = generateExperimentMatrix(time_scale=time_scale)
+    saveExperimentMatrixToJson("CCC5p2_ExpMatrix_Test.json", expMatrix)
+
+    from Connection.Connection import Connection
+    connect = Connection()
+    connect.scanForDevices()
+
+    expResults = runExperimentMatrix(connect, expMatrix, delay_min=0, bypass_on=False, test_mode=test_mode)
+
+    with open('CCC5p2_ExpLog_Test.json', 'w') as f:
+        json.dump(expResults, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -8,11 +8,10 @@ try:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 except NameError:
     BASE_DIR = os.getcwd() 
-from time import sleep
 from threading import Event
-from PySide6.QtCore import QRunnable, QTimer
 from Experiment_Config import VALVE_ID, COATING_CONFIG, TEST_MODE
 from Experiment.CCC5P2_Experiment import setMuxValves
+from Experiment.Scheduler import MonotonicScheduler
 
 def runPrefillCoating(connection, scr_update=None, stop_event=None,
                       feed_time=None, wait_time=None, cycles=None, test_mode=TEST_MODE):
@@ -41,37 +40,40 @@ def runPrefillCoating(connection, scr_update=None, stop_event=None,
 
     scr_update("Starting prefill coating...")
 
-    # initial valve setup
-    connection.setValveState(VALVE_ID["muxIn"], True)
-    connection.setValveState(VALVE_ID["fresh"], True)
-    connection.setValveState(VALVE_ID["outlet"], True)
+    # initial valve setup, sent as one frame per board
+    with connection.batch():
+        connection.setValveState(VALVE_ID["muxIn"], True)
+        connection.setValveState(VALVE_ID["fresh"], True)
+        connection.setValveState(VALVE_ID["outlet"], True)
 
-    connection.setValveStates({vid: False for vid in VALVE_ID["bypass"].values()})
-    connection.setValveStates({vid: True for pair in VALVE_ID["chamberIn"].values() for vid in pair})
+        connection.setValveStates({vid: False for vid in VALVE_ID["bypass"].values()})
+        connection.setValveStates({vid: True for pair in VALVE_ID["chamberIn"].values() for vid in pair})
 
-
-    sleep(wait_time)
-
-    # Coating process
+    # Coating process: every column switch is scheduled from one origin, so waits never drift
+    scheduler = MonotonicScheduler(stop_event=stop_event)
     for cycle in range(cycles):
         for col in range(1, 17):
-            if stop_event and stop_event.is_set():
-                scr_update("Prefill coating stopped by user.")
-                return
-            setMuxValves(connection, VALVE_ID["mux"], col)
-            scr_update(f"Cycle {cycle+1}: Coating column {col}")
-            sleep(feed_time)
+            scheduler.schedule(wait_time + (cycle * 16 + col - 1) * feed_time, (cycle, col))
 
-    sleep(wait_time)
+    for (cycle, col), _ in scheduler:
+        setMuxValves(connection, VALVE_ID["mux"], col)
+        scr_update(f"Cycle {cycle+1}: Coating column {col}")
+
+    if not scheduler.waitUntil(wait_time + cycles * 16 * feed_time + wait_time):
+        scr_update("Prefill coating stopped by user.")
+        return
 
     # final cleanup
     scr_update("Prefill coating complete. Opening all valves, closing fresh_in.")
-    connection.setValveStates({vid: True for vid in range(48)})
-    connection.setValveState(VALVE_ID["fresh"], False)
+    with connection.batch():
+        connection.setValveStates({vid: True for vid in range(48)})
+        connection.setValveState(VALVE_ID["fresh"], False)
+    connection.waitForWrites(timeout=5.0)
+
+class PrefillCoatingRunner:
+    """Runs prefill coating for the GUI; start it with QThreadPool.globalInstance().start(runner.run)."""
 
-class PrefillCoatingRunner(QRunnable):
     def __init__(self, gui, test_mode=False, feed_time=None, wait_time=None, cycles=None):
-        super().__init__()
         self.gui = gui
         self.test_mode = test_mode
         self.feed_time = feed_time
@@ -97,12 +99,12 @@ class PrefillCoatingRunner(QRunnable):
                 cycles=self.cycles,
                 test_mode=self.test_mode
             )
-            QTimer.singleShot(0, lambda: self.gui.logMessage("Prefill coating completed."))
+            self.gui.logMessage("Prefill coating completed.")
         except Exception as e:
             import traceback
             tb = traceback.format_exc()
-            QTimer.singleShot(0, lambda: self.gui.logMessage(f"Prefill coating failed: {e}"))
-            QTimer.singleShot(0, lambda: self.gui.logMessage(tb))
+            self.gui.logMessage(f"Prefill coating failed: {e}")
+            self.gui.logMessage(tb)
         finally:
             self._is_running = False
 
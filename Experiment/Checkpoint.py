@@ -0,0 +1,73 @@
+''' Checkpoints for resuming interrupted experiment runs '''
+
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import os
+import time
+
+from Experiment.Frame_Program import FeedCycle
+
+MISSED_POLICIES = ("skip", "run", "compress")
+
+
+def saveCheckpoint(path: str, checkpoint: Dict[str, Any]):
+    """
+    Atomically replace the checkpoint file.
+
+    The data is written compactly to a temp file, fsynced and renamed over
+    `path`, so a crash or power cut leaves the previous checkpoint or the
+    new one, never a torn file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def loadCheckpoint(path: str) -> Optional[Dict[str, Any]]:
+    """Read a checkpoint, or None if there is none (or it is unreadable)."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def isResumable(checkpoint: Optional[Dict[str, Any]]) -> bool:
+    """Check if a checkpoint belongs to a run that stopped before its last feed."""
+    return bool(checkpoint) and not checkpoint.get("complete") and \
+        checkpoint.get("next_feed", 0) < checkpoint.get("total_feeds", 0)
+
+
+def originMonotonic(checkpoint: Dict[str, Any]) -> float:
+    """Map the checkpoint's wall-clock schedule origin onto this process's time.monotonic()."""
+    return time.monotonic() - (time.time() - checkpoint["origin_epoch"])
+
+
+def selectResumeFeeds(feeds: Sequence[FeedCycle], elapsed_s: float, policy: str) -> List[FeedCycle]:
+    """
+    Choose which remaining cycles to run after a resume.
+
+    Cycles planned before `elapsed_s` were missed while the run was down:
+      skip:     drop them and continue with the first cycle still ahead
+      run:      run all of them immediately, then continue on schedule
+      compress: run only the most recent missed cycle per set of wells, then continue
+    """
+    if policy not in MISSED_POLICIES:
+        raise ValueError(f"Unknown missed-entry policy: {policy} (expected one of {', '.join(MISSED_POLICIES)})")
+    missed = [feed for feed in feeds if feed.planned_s < elapsed_s]
+    ahead = [feed for feed in feeds if feed.planned_s >= elapsed_s]
+    if policy == "skip":
+        return ahead
+    if policy == "run":
+        return list(feeds)
+    latest: Dict[tuple, FeedCycle] = {}
+    for feed in missed:
+        latest[tuple(sorted((row, feed.col) for _, row, _, _ in feed.wells))] = feed
+    kept = set(map(id, latest.values()))
+    return [feed for feed in missed if id(feed) in kept] + ahead
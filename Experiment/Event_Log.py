@@ -0,0 +1,271 @@
+''' Append-only JSON Lines event log with a background writer '''
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import numpy as np
+
+INDEX_SUFFIX = ".index.json"
+_STOP = object()
+
+
+def newRunId() -> str:
+    """Sortable, unique id for one experiment run."""
+    return f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def runLogPath(directory: str, name: str, run_id: str) -> str:
+    """Per-run log file name, so a new run never overwrites an old log."""
+    return os.path.join(directory, f"{name}_{run_id}.jsonl")
+
+
+def indexPath(path: str) -> str:
+    """Sidecar index/summary file that belongs to a log file."""
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def _jsonDefault(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def writeJsonAtomic(path: str, data: Any):
+    """Write JSON to a temp file and rename it over `path`, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, default=_jsonDefault)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class EventLog:
+    """
+    Append-only JSONL log written by a background thread.
+
+    write() only stamps the event and puts it on a queue, so it is cheap
+    enough for the timing-critical thread; numpy arrays may be passed as-is
+    and are serialized by the writer. The writer batches queued events into
+    one write per `flush_interval_s` (or `batch_size` events) and fsyncs at
+    most every `fsync_interval_s`. Every line is a complete JSON object, so a
+    crash loses at most the unflushed tail and never corrupts earlier lines.
+
+    A sidecar (see indexPath) holds the run summary, event counts and a
+    sparse index of (record number, byte offset, time) every `index_every`
+    records, which lets readEvents seek instead of scanning the whole file.
+    """
+
+    def __init__(self, path: str, run_id: Optional[str] = None, fsync_interval_s: float = 5.0,
+                 flush_interval_s: float = 0.5, batch_size: int = 512, index_every: int = 1000):
+        self.path = path
+        self.index_path = indexPath(path)
+        self.run_id = run_id or newRunId()
+        self.fsync_interval_s = fsync_interval_s
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+        self.index_every = index_every
+
+        self.records = 0
+        self.bytes_written = 0
+        self.counts: Dict[str, int] = {}
+        self.first_t: Optional[float] = None
+        self.last_t: Optional[float] = None
+        self.index: List[List[float]] = []
+        self.summary: Dict[str, Any] = {}
+        self.complete = False
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._last_fsync = 0.0
+
+    def __enter__(self) -> "EventLog":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def isRunning(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Open the log for appending and start the writer thread."""
+        if self.isRunning():
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            self._recover()
+        self._file = open(self.path, "ab")
+        self.bytes_written = self._file.tell()
+        self._last_fsync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"EventLog-{self.run_id}", daemon=True)
+        self._thread.start()
+
+    def _recover(self):
+        """
+        Continue an existing log (e.g. a resumed run) instead of starting the sidecar over.
+
+        Counts, the sparse index and first/last times are rebuilt by scanning
+        the file, since the sidecar may lag behind the last flushed lines; the
+        summary, which only the sidecar holds, is carried over from it. A
+        truncated last line is cut off so appended records start on a fresh line.
+        """
+        previous = readIndex(self.path) or {}
+        self.summary = dict(previous.get("summary") or {})
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                self.bytes_written = offset
+                self._count(record)
+                offset += len(line)
+        if offset < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+    def write(self, event: str, **fields):
+        """Queue one event; `t` (epoch seconds) and `event` are added to the record."""
+        self._queue.put({"t": time.time(), "event": event, **fields})
+
+    def setSummary(self, **fields):
+        """Add fields to the run summary kept in the sidecar."""
+        self._queue.put(("summary", fields))
+
+    def close(self, timeout: float = 5.0):
+        """Write everything still queued, fsync, finalize the sidecar and stop the writer."""
+        if not self.isRunning():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval_s))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            lines = []
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                    continue
+                if isinstance(item, tuple):
+                    self.summary.update(item[1])
+                    continue
+                lines.append(self._encode(item))
+            if lines:
+                data = b"".join(lines)
+                self._file.write(data)
+                self._file.flush()
+            if stopping or time.monotonic() - self._last_fsync >= self.fsync_interval_s:
+                self._sync()
+
+        self.complete = True
+        self._sync()
+        self._file.close()
+
+    def _encode(self, record: Dict[str, Any]) -> bytes:
+        line = (json.dumps(record, default=_jsonDefault) + "\n").encode("utf-8")
+        self._count(record)
+        self.bytes_written += len(line)
+        return line
+
+    def _count(self, record: Dict[str, Any]):
+        """Add one record (starting at byte offset `bytes_written`) to the counts and index."""
+        if self.records % self.index_every == 0:
+            self.index.append([self.records, self.bytes_written, record.get("t")])
+        self.records += 1
+        event = record.get("event")
+        self.counts[event] = self.counts.get(event, 0) + 1
+        if self.first_t is None:
+            self.first_t = record.get("t")
+        self.last_t = record.get("t")
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        writeJsonAtomic(self.index_path, self.sidecar())
+
+    def sidecar(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "log": os.path.basename(self.path),
+            "complete": self.complete,
+            "records": self.records,
+            "bytes": self.bytes_written,
+            "first_t": self.first_t,
+            "last_t": self.last_t,
+            "counts": self.counts,
+            "summary": self.summary,
+            "index": self.index,
+        }
+
+
+def readIndex(path: str) -> Optional[Dict[str, Any]]:
+    """Load the sidecar of a log file, or None if it has none."""
+    try:
+        with open(indexPath(path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def readEvents(path: str, events: Optional[Sequence[str]] = None, since: Optional[float] = None,
+               until: Optional[float] = None, **match) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from a JSONL event log without loading the whole file.
+
+    events: only these event types (checked on the raw line before parsing)
+    since/until: epoch-second bounds on `t`; `since` seeks via the sidecar index
+    match: field=value pairs every returned record must have
+    A truncated last line (crash mid-write) is skipped.
+    """
+    offset = 0
+    if since is not None:
+        index = readIndex(path)
+        for _, byte_offset, t in (index or {}).get("index", []):
+            if t > since:
+                break
+            offset = byte_offset
+    needles = [f'"event": {json.dumps(e)}'.encode("utf-8") for e in events] if events else None
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if needles and not any(needle in line for needle in needles):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            t = record.get("t", 0)
+            if since is not None and t < since:
+                continue
+            if until is not None and t > until:
+                continue
+            if all(record.get(k) == v for k, v in match.items()):
+                yield record
@@ -0,0 +1,499 @@
+''' Compile experiment matrices into precomputed valve frame programs '''
+
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+from Experiment.Mux_Decoder import MuxDecoder
+from Experiment.Scheduler import MonotonicScheduler
+
+TEST_MODE_TIME_DIVISOR = 180.0   # Test mode runs protocol steps 180x faster
+SETTLE_TIME = 1                  # Seconds between closing the input and starting the purge
+SLIP_TOLERANCE_S = 0.05          # Overlapped runs shift the remaining timeline once a frame is later than this
+
+
+class Frame:
+    """One protocol step: the valves that change at `offset_s` into a feed cycle."""
+
+    def __init__(self, offset_s: float, label: str, ids: np.ndarray, states: np.ndarray,
+                 holds: FrozenSet[int] = frozenset()):
+        self.offset_s = offset_s
+        self.label = label
+        self.ids = ids              # Valve IDs that change in this frame
+        self.states = states        # New state of each changed valve
+        self.holds = holds          # Valves the cycle owns from this frame until its next one
+
+
+class FeedCycle:
+    """
+    All frames of one feed cycle, with offsets relative to the start of the cycle.
+
+    A cycle usually serves one matrix entry; a coalesced cycle feeds several
+    rows of the same column at once and lists every (entry_index, row, side,
+    planned_s) in `wells`, each with the time its own matrix entry was planned
+    for. entry_index/row/side/planned_s describe the first of them.
+    """
+
+    def __init__(self, entry_index: int, input_valve: int, row: int, col: int, side: int,
+                 planned_s: float, frames: List[Frame], duration_s: float,
+                 wells: Optional[List[Tuple[int, int, int, float]]] = None):
+        self.entry_index = entry_index
+        self.input_valve = input_valve
+        self.row = row
+        self.col = col
+        self.side = side
+        self.wells = wells or [(entry_index, row, side, planned_s)]
+        self.planned_s = planned_s      # Offset of the matrix entry from the run origin
+        self.start_s = planned_s        # Predicted start once earlier cycles are accounted for
+        self.frames = frames
+        self.duration_s = duration_s
+
+    @property
+    def end_s(self) -> float:
+        return self.start_s + self.duration_s
+
+    @property
+    def lateness_s(self) -> float:
+        return self.start_s - self.planned_s
+
+    def phases(self) -> List[Tuple[float, float, FrozenSet[int]]]:
+        """(start, end, held valves) per frame, relative to the cycle start; the last frame is instantaneous."""
+        ends = [frame.offset_s for frame in self.frames[1:]] + [self.duration_s]
+        return [(frame.offset_s, end, frame.holds) for frame, end in zip(self.frames, ends)]
+
+
+class FrameProgram:
+    """
+    A compiled experiment: every feed cycle as a list of pre-diffed valve frames.
+
+    Compiling ahead of time gives the exact run duration, per-valve activation
+    counts and a dry-run trace without touching hardware; the executor only
+    waits and sends one frame per step.
+
+    With `overlap` a cycle may start before the previous one has finished, as
+    long as none of its phases holds a valve that a running phase holds
+    (see phaseFootprint); otherwise cycles run strictly one after another.
+    """
+
+    def __init__(self, ids: Sequence[int], feeds: List[FeedCycle], skipped: List[Tuple[int, str]],
+                 overlap: bool = False):
+        self.ids = np.array(sorted(ids), dtype=np.intp)
+        self.feeds = feeds
+        self.skipped = skipped          # (entry_index, reason) for entries that could not be compiled
+        self.overlap = overlap
+        if overlap:
+            self._retimeOverlapped()
+        else:
+            self._retime()
+
+    def _retime(self):
+        """Predict when each cycle starts: at its planned time, or when the previous one ends."""
+        free_at = float("-inf")
+        for feed in self.feeds:
+            feed.start_s = max(feed.planned_s, free_at)
+            free_at = feed.end_s
+
+    def _retimeOverlapped(self):
+        """
+        Start each cycle at the earliest time from its planned time on at which
+        every one of its phases is valve-disjoint from the phases already placed.
+
+        Cycles keep their planned order (a cycle never starts before the one
+        ahead of it), so feeds to the same well stay in sequence.
+        """
+        placed: List[Tuple[float, float, FrozenSet[int]]] = []
+        last_start = float("-inf")
+        for feed in self.feeds:
+            phases = feed.phases()
+            start = max(feed.planned_s, last_start)
+            placed = [p for p in placed if p[1] > start]
+            while True:
+                push = None
+                for rel_start, rel_end, holds in phases:
+                    begin = start + rel_start
+                    end = max(start + rel_end, begin + 1e-9)
+                    for other_begin, other_end, other_holds in placed:
+                        if other_begin < end and begin < other_end and holds & other_holds:
+                            push = max(push or start, other_end - rel_start)
+                if push is None:
+                    break
+                start = push
+            feed.start_s = last_start = start
+            placed.extend((start + a, start + b, holds) for a, b, holds in phases)
+
+    @property
+    def duration_s(self) -> float:
+        return max((feed.end_s for feed in self.feeds), default=0.0)
+
+    def frameCount(self) -> int:
+        return sum(len(feed.frames) for feed in self.feeds)
+
+    def timeline(self) -> List[Tuple[float, FeedCycle, Frame]]:
+        """(absolute offset, feed, frame) for every frame in run order."""
+        frames = [(feed.start_s + frame.offset_s, feed, frame) for feed in self.feeds for frame in feed.frames]
+        if self.overlap:
+            frames.sort(key=lambda item: item[0])
+        return frames
+
+    def activationCounts(self) -> Dict[int, int]:
+        """Count closed → open transitions per valve over the whole program."""
+        counts = {int(v): 0 for v in self.ids}
+        state: Dict[int, bool] = {}
+        for _, _, frame in self.timeline():
+            for valve, open_ in zip(frame.ids.tolist(), frame.states.tolist()):
+                if open_ and not state.get(valve, False):
+                    counts[valve] += 1
+                state[valve] = open_
+        return counts
+
+    def transitionCount(self) -> int:
+        """Count actual valve state changes (opens and closes) over the whole program."""
+        count = 0
+        state: Dict[int, bool] = {}
+        for _, _, frame in self.timeline():
+            for valve, open_ in zip(frame.ids.tolist(), frame.states.tolist()):
+                if open_ != state.get(valve, False):
+                    count += 1
+                state[valve] = open_
+        return count
+
+    def trace(self) -> List[dict]:
+        """Dry-run trace: one record per frame with the valves it opens and closes."""
+        index = {int(v): i for i, v in enumerate(self.ids)}
+        records = []
+        state = 0
+        for t, feed, frame in self.timeline():
+            for valve, open_ in zip(frame.ids.tolist(), frame.states.tolist()):
+                bit = 1 << index[valve]
+                state = state | bit if open_ else state & ~bit
+            records.append({
+                "t_s": round(t, 3),
+                "entry": feed.entry_index,
+                "row": feed.row,
+                "col": feed.col,
+                "step": frame.label,
+                "open": [v for v, s in zip(frame.ids.tolist(), frame.states.tolist()) if s],
+                "close": [v for v, s in zip(frame.ids.tolist(), frame.states.tolist()) if not s],
+                "state": f"{state:0{(len(self.ids) + 3) // 4}x}",
+            })
+        return records
+
+    def summary(self) -> dict:
+        return {
+            "feeds": len(self.feeds),
+            "overlap": self.overlap,
+            "frames": self.frameCount(),
+            "skipped": len(self.skipped),
+            "duration_s": self.duration_s,
+            "max_lateness_s": max((f.lateness_s for f in self.feeds), default=0.0),
+            "valve_activations": sum(self.activationCounts().values()),
+        }
+
+
+def compareProgram(baseline: FrameProgram, optimized: FrameProgram) -> dict:
+    """Time and valve actuations an optimized program saves over the baseline compile of the same matrix."""
+    def busy_s(program: FrameProgram) -> float:
+        return sum(feed.duration_s for feed in program.feeds)
+
+    return {
+        "cycles_saved": len(baseline.feeds) - len(optimized.feeds),
+        "busy_time_saved_s": busy_s(baseline) - busy_s(optimized),
+        "duration_saved_s": baseline.duration_s - optimized.duration_s,
+        "max_lateness_saved_s": baseline.summary()["max_lateness_s"] - optimized.summary()["max_lateness_s"],
+        "actuations_saved": baseline.transitionCount() - optimized.transitionCount(),
+    }
+
+
+def protocolValves(valve_id: dict, input_valves: Sequence[int] = ()) -> List[int]:
+    """Every valve a feed cycle may drive."""
+    valves = set(valve_id["mux"]) | {valve_id["purge"], valve_id["fresh"], valve_id["muxIn"], valve_id["outlet"]}
+    valves |= set(valve_id["bypass"].values())
+    valves |= {v for pair in valve_id["chamberIn"].values() for v in pair}
+    return sorted(valves | set(input_valves))
+
+
+def feedCycleSteps(input_valve: int, row: int, col: int, side: int, valve_id: dict, timing: dict,
+                   mux: MuxDecoder, bypass_on: bool = False,
+                   wells: Optional[Sequence[Tuple[int, int]]] = None,
+                   primed: bool = False, keep_primed: bool = False) -> List[Tuple[float, str, Dict[int, bool]]]:
+    """
+    The CCC5P2 feed cycle as (duration before this step, label, valve changes).
+
+    `wells` lists (row, side) pairs fed together from one prefill and purge;
+    it defaults to the single (row, side). A `primed` cycle follows one of
+    the same input and column that left the line filled, so it skips the
+    purge and prefill and feeds straight away; `keep_primed` ends the cycle
+    without the purge and flush so the next cycle can do that.
+    """
+    bypass = valve_id["bypass"]
+    wells = wells or [(row, side)]
+
+    prefill = mux.stateDict(col)
+    prefill.update({vid: True for vid in bypass.values()})
+    prefill.update({input_valve: True, valve_id["muxIn"]: True, valve_id["purge"]: True, valve_id["outlet"]: True})
+
+    feed: Dict[int, bool] = {}
+    clean: Dict[int, bool] = {}
+    for well_row, well_side in wells:
+        left_valve, right_valve = valve_id["chamberIn"][well_row]
+        chambers = {0: [left_valve], 1: [right_valve], 2: [left_valve, right_valve]}.get(well_side, [])
+        if not bypass_on:
+            feed[bypass[well_row]] = False
+        feed.update({vid: True for vid in chambers})
+        clean.update({left_valve: False, right_valve: False, bypass[well_row]: True})
+    clean[input_valve] = False
+
+    finish = {valve_id["fresh"]: False, valve_id["muxIn"]: False, valve_id["outlet"]: False}
+    finish.update({vid: False for vid in bypass.values()})
+
+    if primed:
+        del prefill[valve_id["purge"]]
+        prefill.update(feed)
+        steps = [(0, "Feed chambers", prefill)]
+    else:
+        steps = [
+            (0, "Prefill pathways", prefill),
+            (timing["purgeTime1"], "Prefill", {valve_id["purge"]: False}),
+            (timing["prefillTime"], "Feed chambers", feed),
+        ]
+    steps.append((timing["feedTime"], "Clean pathways", clean))
+    if keep_primed:
+        steps.append((SETTLE_TIME, "Close", finish))
+    else:
+        steps += [
+            (SETTLE_TIME, "Purge", {valve_id["purge"]: True, valve_id["fresh"]: True}),
+            (timing["purgeTime2"], "Flush", {valve_id["purge"]: False}),
+            (timing["purgeTime3"], "Close", finish),
+        ]
+    return steps
+
+
+def phaseFootprint(cycle_state: Dict[int, bool], changes: Dict[int, bool], valve_id: dict,
+                   mux: MuxDecoder) -> FrozenSet[int]:
+    """
+    Valves a cycle must own after applying `changes`, until its next frame.
+
+    That is every valve the cycle has open, every valve it just switched, the
+    whole MUX code word while the MUX input is open (the selected column is a
+    fluid path) and the whole bypass bank while any bypass is open (rows share
+    the outlet). Two cycles may only run concurrently while these sets are
+    disjoint, so no valve or fluid path is ever driven by both.
+    """
+    held = {valve for valve, open_ in cycle_state.items() if open_} | set(changes)
+    if cycle_state.get(valve_id["muxIn"]):
+        held |= set(mux.valves)
+    bypass = set(valve_id["bypass"].values())
+    if held & bypass:
+        held |= bypass
+    return frozenset(held)
+
+
+def coalesceEntries(entries: Sequence[Tuple[float, int, int, int, int, int]], window_s: float
+                    ) -> List[Tuple[float, int, int, List[Tuple[int, int, int, float]]]]:
+    """
+    Merge entries that share (input valve, column) into one feed cycle.
+
+    entries are (planned_s, entry_index, input_valve, row, col, side) in time
+    order. An entry joins the open group for its (input, column) if it is
+    planned at most `window_s` after the group's first entry and its row is
+    not already in the group; the group runs at that first entry's time.
+    Returns (planned_s, input_valve, col, [(entry_index, row, side, planned_s)])
+    per cycle, keeping each merged entry's own planned time.
+    """
+    groups: List[Tuple[float, int, int, List[Tuple[int, int, int, float]]]] = []
+    open_groups: Dict[Tuple[int, int], Tuple[float, int, int, List[Tuple[int, int, int, float]]]] = {}
+    for planned_s, entry_index, input_valve, row, col, side in entries:
+        group = open_groups.get((input_valve, col))
+        if group is not None and planned_s - group[0] <= window_s and all(w[1] != row for w in group[3]):
+            group[3].append((entry_index, row, side, planned_s))
+            continue
+        group = (planned_s, input_valve, col, [(entry_index, row, side, planned_s)])
+        open_groups[(input_valve, col)] = group
+        groups.append(group)
+    return groups
+
+
+def optimizeFeedOrder(groups: Sequence[Tuple[float, int, int, List[Tuple[int, int, int, float]]]], window_s: float,
+                      mux: MuxDecoder) -> List[Tuple[float, int, int, List[Tuple[int, int, int, float]]]]:
+    """
+    Reorder cycles inside each `window_s` window to reuse primed lines and the MUX setting.
+
+    groups are (planned_s, input_valve, col, wells) in time order, as from
+    coalesceEntries. Within a window the next cycle is picked greedily: one
+    with the same input and column as the previous cycle first, then the
+    fewest MUX valve transitions from the previous column, then the original
+    order. The window's planned times are handed out in order, so each slot
+    keeps its time and a cycle moves at most one window. Feeds to the same
+    well never change order.
+    """
+    ordered: List[Tuple[float, int, int, List[Tuple[int, int, int, float]]]] = []
+    prev_input, prev_col = None, None
+    i = 0
+    while i < len(groups):
+        j = i
+        while j < len(groups) and groups[j][0] - groups[i][0] <= window_s:
+            j += 1
+        window = list(groups[i:j])
+        for slot_s in [group[0] for group in window]:
+            def eligible(k):
+                wells = {(row, window[k][2]) for _, row, _, _ in window[k][3]}
+                return not any(wells & {(row, window[m][2]) for _, row, _, _ in window[m][3]} for m in range(k))
+
+            def cost(k):
+                _, input_valve, col, _ = window[k]
+                same_line = input_valve == prev_input and col == prev_col
+                transitions = mux.transitions(prev_col, col) if prev_col is not None else 0
+                return (not same_line, transitions, k)
+
+            k = min((k for k in range(len(window)) if eligible(k)), key=cost)
+            _, prev_input, prev_col, wells = window.pop(k)
+            ordered.append((slot_s, prev_input, prev_col, wells))
+        i = j
+    return ordered
+
+
+def cycleDuration(timing: dict) -> float:
+    """Length in seconds of one feed cycle as laid out by feedCycleSteps."""
+    return (timing["purgeTime1"] + timing["prefillTime"] + timing["feedTime"] + SETTLE_TIME
+            + timing["purgeTime2"] + timing["purgeTime3"])
+
+
+def compileProgram(matrix: List[List], valve_id: dict, timing: dict, mux: MuxDecoder,
+                   delay_min: float = 0, bypass_on: bool = False, test_mode: bool = False,
+                   overlap: bool = False, coalesce_window: Optional[float] = None,
+                   optimize_window: Optional[float] = None) -> FrameProgram:
+    """
+    Compile an experiment matrix ([time, valve, row, col, side, _] rows) into a FrameProgram.
+
+    Matrix times are minutes (seconds in test mode); protocol step times come
+    from `timing` in seconds and are divided by TEST_MODE_TIME_DIVISOR in test mode.
+    With `coalesce_window` (matrix time units), entries for the same input
+    and column within the window share one cycle (see coalesceEntries).
+    With `optimize_window`, cycles are reordered inside that window (see
+    optimizeFeedOrder), and back-to-back cycles of the same input and column
+    skip the purge between them if the next one starts within
+    timing["primeHoldTime"] seconds.
+    """
+    unit_s = 1 if test_mode else 60
+    step_scale = 1 / TEST_MODE_TIME_DIVISOR if test_mode else 1
+    ids = protocolValves(valve_id, [row[1] for row in matrix])
+
+    entries: List[Tuple[float, int, int, int, int, int]] = []
+    skipped: List[Tuple[int, str]] = []
+    for entry_index in sorted(range(len(matrix)), key=lambda i: matrix[i][0]):
+        time_, input_valve, row_num, col_raw, side = matrix[entry_index][:5]
+        try:
+            col = int(col_raw)
+        except (TypeError, ValueError):
+            skipped.append((entry_index, f"Non-integer column index: {col_raw}"))
+            continue
+        if not (1 <= col <= mux.num_columns):
+            skipped.append((entry_index, f"Invalid column index: {col}"))
+            continue
+        entries.append(((time_ + delay_min) * unit_s, entry_index, input_valve, int(row_num), col, side))
+
+    if coalesce_window is None:
+        groups = [(planned_s, input_valve, col, [(entry_index, row, side, planned_s)])
+                  for planned_s, entry_index, input_valve, row, col, side in entries]
+    else:
+        groups = coalesceEntries(entries, coalesce_window * unit_s)
+    if optimize_window is not None:
+        groups = optimizeFeedOrder(groups, optimize_window * unit_s, mux)
+    prime_hold_s = timing.get("primeHoldTime", 0) * step_scale if optimize_window is not None else None
+
+    feeds: List[FeedCycle] = []
+    primed = False
+    free_at = float("-inf")
+    for n, (planned_s, input_valve, col, wells) in enumerate(groups):
+        entry_index, row_num, side, _ = wells[0]
+        well_sides = [(row, well_side) for _, row, well_side, _ in wells]
+        keep_primed = False
+        if prime_hold_s is not None and n + 1 < len(groups) and groups[n + 1][1:3] == (input_valve, col):
+            held = feedCycleSteps(input_valve, row_num, col, side, valve_id, timing, mux, bypass_on,
+                                  wells=well_sides, primed=primed, keep_primed=True)
+            end_s = max(planned_s, free_at) + sum(wait for wait, _, _ in held) * step_scale
+            keep_primed = groups[n + 1][0] - end_s <= prime_hold_s
+        steps = feedCycleSteps(input_valve, row_num, col, side, valve_id, timing, mux, bypass_on,
+                               wells=well_sides, primed=primed, keep_primed=keep_primed)
+
+        frames: List[Frame] = []
+        offset = 0.0
+        cycle_state: Dict[int, bool] = {}
+        for wait, label, changes in steps:
+            offset += wait * step_scale
+            cycle_state.update(changes)
+            frame_ids = np.array(list(changes.keys()), dtype=np.intp)
+            frame_states = np.array(list(changes.values()), dtype=bool)
+            holds = phaseFootprint(cycle_state, changes, valve_id, mux)
+            frames.append(Frame(offset, label, frame_ids, frame_states, holds))
+
+        feeds.append(FeedCycle(entry_index, input_valve, row_num, col, side, planned_s, frames, offset, wells))
+        free_at = max(planned_s, free_at) + offset
+        primed = keep_primed
+
+    return FrameProgram(ids, feeds, skipped, overlap=overlap)
+
+
+def executeProgram(connection, program: FrameProgram, scheduler: MonotonicScheduler,
+                   on_frame: Optional[Callable[[FeedCycle, Frame], None]] = None
+                   ) -> Iterator[Tuple[FeedCycle, dict]]:
+    """
+    Run a program on a Connection, yielding (feed, schedule record) after each cycle.
+
+    A cycle starts at its planned offset, or immediately if the previous one
+    overran; frames inside a cycle keep their relative spacing from the actual
+    start, so a late cycle never shortens a purge or feed step. Stopping the
+    scheduler takes effect between cycles: a cycle that has started always
+    runs through its purge, and no further cycle starts.
+    """
+    if program.overlap:
+        yield from executeOverlapped(connection, program, scheduler, on_frame)
+        return
+    for feed in program.feeds:
+        if not scheduler.waitUntil(feed.planned_s):
+            return
+        anchor = max(scheduler.elapsed(), feed.planned_s)
+        record = scheduler.record(feed.planned_s, anchor)
+        for frame in feed.frames:
+            scheduler.waitUntil(anchor + frame.offset_s, interruptible=False)
+            connection.applyArray(frame.ids, frame.states)
+            if on_frame:
+                on_frame(feed, frame)
+        yield feed, record
+
+
+def executeOverlapped(connection, program: FrameProgram, scheduler: MonotonicScheduler,
+                      on_frame: Optional[Callable[[FeedCycle, Frame], None]] = None
+                      ) -> Iterator[Tuple[FeedCycle, dict]]:
+    """
+    Run an overlapped program as one merged timeline of predicted frame times.
+
+    When a frame goes out more than SLIP_TOLERANCE_S late, every remaining
+    frame is shifted by the same amount. Phases in progress are stretched,
+    never shortened, and concurrent cycles shift together, so the
+    valve-disjointness checked at compile time still holds. After a stop no
+    new cycle starts, but cycles already running finish their frames.
+    """
+    slip = 0.0
+    remaining = {id(feed): len(feed.frames) for feed in program.feeds}
+    records: Dict[int, dict] = {}
+    for t, feed, frame in program.timeline():
+        if frame is feed.frames[0]:
+            if not scheduler.waitUntil(t + slip):
+                if not records:
+                    return
+                continue   # Stopped: let the cycles in progress finish, start no new one
+        elif id(feed) not in records:
+            continue   # Its cycle never started
+        else:
+            scheduler.waitUntil(t + slip, interruptible=False)
+        late = scheduler.elapsed() - (t + slip)
+        if late > SLIP_TOLERANCE_S:
+            slip += late
+        if frame is feed.frames[0]:
+            records[id(feed)] = scheduler.record(feed.planned_s, scheduler.elapsed())
+        connection.applyArray(frame.ids, frame.states)
+        if on_frame:
+            on_frame(feed, frame)
+        remaining[id(feed)] -= 1
+        if remaining[id(feed)] == 0:
+            yield feed, records.pop(id(feed))
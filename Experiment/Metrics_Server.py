@@ -0,0 +1,227 @@
+''' Local HTTP / Unix-socket endpoint with live run status and Prometheus metrics '''
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+import json
+import os
+import socketserver
+import threading
+import time
+
+DEFAULT_METRICS_PORT = 9105
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RunStatus:
+    """
+    Progress of the current experiment run, shared with the metrics endpoint.
+
+    runExperimentMatrix updates it a few times per feed cycle (a lock and a
+    handful of assignments); readers take a consistent copy with snapshot().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.run_id: Optional[str] = None
+        self.state = "idle"
+        self.started_at: Optional[float] = None
+        self.origin_epoch: Optional[float] = None
+        self.planned_duration_s = 0.0
+        self.feeds_total = 0
+        self.feeds_done = 0
+        self.feeds_dropped = 0
+        self.current_entry: Optional[int] = None
+        self.current_col: Optional[int] = None
+        self.current_planned_s: Optional[float] = None
+        self.last_lateness_s = 0.0
+        self.max_lateness_s = 0.0
+
+    def begin(self, run_id: str, feeds_total: int, origin_epoch: float, planned_duration_s: float,
+              feeds_done: int = 0, feeds_dropped: int = 0):
+        with self._lock:
+            self.run_id = run_id
+            self.state = "running"
+            self.started_at = time.time()
+            self.origin_epoch = origin_epoch
+            self.planned_duration_s = planned_duration_s
+            self.feeds_total = feeds_total
+            self.feeds_done = feeds_done
+            self.feeds_dropped = feeds_dropped
+            self.current_entry = self.current_col = self.current_planned_s = None
+            self.last_lateness_s = self.max_lateness_s = 0.0
+
+    def enterFeed(self, entry_index: int, col: int, planned_s: float):
+        with self._lock:
+            self.current_entry, self.current_col, self.current_planned_s = entry_index, col, planned_s
+
+    def feedDone(self, lateness_s: float):
+        with self._lock:
+            self.feeds_done += 1
+            self.last_lateness_s = lateness_s
+            if lateness_s > self.max_lateness_s:
+                self.max_lateness_s = lateness_s
+
+    def finish(self, stopped: bool = False):
+        with self._lock:
+            self.state = "stopped" if stopped else "completed"
+            self.current_entry = self.current_col = self.current_planned_s = None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = time.time() - self.origin_epoch if self.origin_epoch and self.state == "running" else None
+            return {
+                "run_id": self.run_id,
+                "state": self.state,
+                "started_at": self.started_at,
+                "elapsed_s": elapsed,
+                "planned_duration_s": self.planned_duration_s,
+                "feeds_total": self.feeds_total,
+                "feeds_done": self.feeds_done,
+                "feeds_dropped": self.feeds_dropped,
+                "feeds_remaining": max(0, self.feeds_total - self.feeds_done - self.feeds_dropped),
+                "current_entry": self.current_entry,
+                "current_col": self.current_col,
+                "current_planned_s": self.current_planned_s,
+                "last_lateness_s": self.last_lateness_s,
+                "max_lateness_s": self.max_lateness_s,
+            }
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheusText(status: dict, io: dict) -> str:
+    """Render a RunStatus snapshot and a Connection.metricsSnapshot() in Prometheus text format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    metric("ccc5_run_info", "gauge", "Current run id and state.",
+           [({"run_id": status["run_id"] or "", "state": status["state"]}, 1)])
+    metric("ccc5_feeds_total", "gauge", "Feed cycles in the current run.", [({}, status["feeds_total"])])
+    metric("ccc5_feeds_completed", "gauge", "Feed cycles completed.", [({}, status["feeds_done"])])
+    metric("ccc5_feeds_remaining", "gauge", "Feed cycles still to run.", [({}, status["feeds_remaining"])])
+    metric("ccc5_current_entry", "gauge", "Matrix entry of the cycle in progress (-1 if none).",
+           [({}, -1 if status["current_entry"] is None else status["current_entry"])])
+    metric("ccc5_run_elapsed_seconds", "gauge", "Seconds since the run's schedule origin.",
+           [({}, status["elapsed_s"] or 0)])
+    metric("ccc5_feed_lateness_seconds", "gauge", "Start lateness of the last cycle versus plan.",
+           [({}, status["last_lateness_s"])])
+    metric("ccc5_feed_lateness_max_seconds", "gauge", "Largest cycle start lateness this run.",
+           [({}, status["max_lateness_s"])])
+
+    metric("ccc5_valve_commits_total", "counter", "Valve state commits.", [({}, io["commits"])])
+    metric("ccc5_valve_actuations_total", "counter", "Times each valve switched state.",
+           [({"valve": valve}, count) for valve, count in sorted(io["actuations"].items())])
+
+    devices = io["devices"]
+    metric("ccc5_serial_connected", "gauge", "1 if the board's port is open.",
+           [({"port": port}, int(d["connected"])) for port, d in devices.items()])
+    metric("ccc5_serial_bytes_written_total", "counter", "Bytes written to the port.",
+           [({"port": port}, d["bytes_written"]) for port, d in devices.items()])
+    metric("ccc5_serial_frames_written_total", "counter", "Frames written to the port.",
+           [({"port": port}, d["frames_written"]) for port, d in devices.items()])
+    metric("ccc5_serial_frames_failed_total", "counter", "Frames dropped after write failures.",
+           [({"port": port}, d["frames_failed"]) for port, d in devices.items()])
+    metric("ccc5_serial_errors_total", "counter", "Serial exceptions by type.",
+           [({"port": port, "type": kind}, count) for port, d in devices.items() for kind, count in d["errors"].items()])
+    metric("ccc5_serial_reconnects_total", "counter", "Reconnects after the first connect.",
+           [({"port": port}, d["reconnects"]) for port, d in devices.items()])
+    metric("ccc5_serial_out_waiting_max_bytes", "gauge", "High-water mark of the OS output buffer.",
+           [({"port": port}, d["out_waiting_max"]) for port, d in devices.items()])
+
+    lines.append("# HELP ccc5_serial_write_seconds Serial write call latency.")
+    lines.append("# TYPE ccc5_serial_write_seconds histogram")
+    for port, d in devices.items():
+        latency, cumulative = d["write_latency"], 0
+        for bound, count in latency["buckets"].items():
+            cumulative += count
+            lines.append(f'ccc5_serial_write_seconds_bucket{{port="{_label(port)}",le="{bound}"}} {cumulative}')
+        lines.append(f'ccc5_serial_write_seconds_sum{{port="{_label(port)}"}} {latency["sum_s"]}')
+        lines.append(f'ccc5_serial_write_seconds_count{{port="{_label(port)}"}} {latency["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "CCC5Metrics/1.0"
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type = self.server.metrics.prometheus().encode(), PROMETHEUS_CONTENT_TYPE
+        elif path in ("/", "/status"):
+            body, content_type = json.dumps(self.server.metrics.status()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)   # BaseHTTPRequestHandler expects a (host, port) address
+
+
+class MetricsServer:
+    """
+    Serve /metrics (Prometheus text) and /status (JSON) on a background thread.
+
+    `address` is "host:port" (default 127.0.0.1), a bare port, or
+    "unix:/path/to.sock". Nothing is computed until a client asks, so an
+    idle endpoint costs one sleeping thread.
+    """
+
+    def __init__(self, connection, status: RunStatus, address: str = f"127.0.0.1:{DEFAULT_METRICS_PORT}"):
+        self.connection = connection
+        self.run_status = status
+        self.address = address
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def status(self) -> dict:
+        return {"run": self.run_status.snapshot(), "io": self.connection.metricsSnapshot()}
+
+    def prometheus(self) -> str:
+        return prometheusText(self.run_status.snapshot(), self.connection.metricsSnapshot())
+
+    def start(self):
+        if self._server:
+            return
+        if self.address.startswith("unix:"):
+            path = self.address[len("unix:"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = _UnixHTTPServer(path, _Handler)
+        else:
+            host, _, port = self.address.rpartition(":")
+            self._server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), _Handler)
+            self._server.daemon_threads = True
+        self._server.metrics = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._server:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        if self.address.startswith("unix:") and os.path.exists(self.address[len("unix:"):]):
+            os.unlink(self.address[len("unix:"):])
+        self._server = None
+        self._thread = None
@@ -0,0 +1,78 @@
+''' Precomputed multiplexer decoder tables for microfluidic chips '''
+
+from typing import Dict, List, Sequence
+import numpy as np
+
+ALL_OPEN = 98       # Debug/override code: every MUX valve open
+ALL_CLOSED = 99     # Debug/override code: every MUX valve closed
+
+
+class MuxDecoder:
+    """
+    Column → MUX valve state table, built once from a declarative description.
+
+    valves:      control valve IDs, in bit order
+    groups:      groups[k] lists the columns for which valves[k] is open
+    num_columns: columns addressable by the multiplexer (1-based)
+
+    Every column, plus the ALL_OPEN/ALL_CLOSED codes, is stored as a bool
+    vector aligned with `ids` and as an integer bitmask over the control valves.
+    """
+
+    def __init__(self, valves: Sequence[int], groups: Sequence[Sequence[int]], num_columns: int):
+        if len(valves) != len(groups):
+            raise ValueError(f"MUX needs one column group per control valve ({len(valves)} valves, {len(groups)} groups)")
+        self.valves = [int(v) for v in valves]
+        self.num_columns = num_columns
+        self.ids = np.array(self.valves, dtype=np.intp)
+
+        self.states: Dict[int, np.ndarray] = {}
+        for column in range(1, num_columns + 1):
+            self.states[column] = np.array([column in group for group in groups], dtype=bool)
+        self.states[ALL_OPEN] = np.ones(len(self.valves), dtype=bool)
+        self.states[ALL_CLOSED] = np.zeros(len(self.valves), dtype=bool)
+
+        self.masks: Dict[int, int] = {
+            column: int(np.dot(states, 1 << np.arange(len(self.valves), dtype=np.int64)))
+            for column, states in self.states.items()
+        }
+
+    @classmethod
+    def binaryTree(cls, valves: Sequence[int], num_columns: int) -> "MuxDecoder":
+        """
+        Build the standard binary multiplexer: one valve pair per address bit,
+        most significant bit first. The first valve of a pair is open for
+        columns whose bit is 0, the second for columns whose bit is 1.
+        """
+        num_bits = max(1, (num_columns - 1).bit_length())
+        if len(valves) != 2 * num_bits:
+            raise ValueError(f"A {num_columns}-column binary MUX needs {2 * num_bits} valves, got {len(valves)}")
+        groups: List[List[int]] = []
+        for bit in reversed(range(num_bits)):
+            zero = [c for c in range(1, num_columns + 1) if not (c - 1) >> bit & 1]
+            one = [c for c in range(1, num_columns + 1) if (c - 1) >> bit & 1]
+            groups.extend([zero, one])
+        return cls(valves, groups, num_columns)
+
+    @classmethod
+    def fromConfig(cls, config: dict) -> "MuxDecoder":
+        """Build a decoder from a MUX_CONFIG-style dictionary."""
+        if config.get("layout") == "binary_tree":
+            return cls.binaryTree(config["valves"], config["num_columns"])
+        return cls(config["valves"], config["groups"], config["num_columns"])
+
+    def isValidColumn(self, column: int) -> bool:
+        """Check if a column index (or override code) is addressable."""
+        return column in self.states
+
+    def stateDict(self, column: int) -> Dict[int, bool]:
+        """Get {valve_id: state} for a column."""
+        return dict(zip(self.valves, self.states[column].tolist()))
+
+    def transitions(self, from_column: int, to_column: int) -> int:
+        """Count the MUX valves that change when switching between two columns."""
+        return bin(self.masks[from_column] ^ self.masks[to_column]).count("1")
+
+    def apply(self, connection, column: int):
+        """Set the MUX to a column with one batched state write."""
+        connection.applyArray(self.ids, self.states[column])
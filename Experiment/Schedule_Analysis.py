@@ -0,0 +1,173 @@
+''' Feasibility analysis and offset planning for sequential feed schedules '''
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def matrixColumns(matrix) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get (time, row, col) arrays from a structured matrix or a list-of-lists matrix."""
+    if isinstance(matrix, np.ndarray) and matrix.dtype.names:
+        return matrix["time"].astype(np.float64), matrix["row"].astype(np.int64), matrix["col"].astype(np.int64)
+    if len(matrix) == 0:
+        empty = np.zeros(0)
+        return empty, empty.astype(np.int64), empty.astype(np.int64)
+    table = np.asarray([entry[:4] for entry in matrix], dtype=np.float64)
+    return table[:, 0], table[:, 2].astype(np.int64), table[:, 3].astype(np.int64)
+
+
+def realizedStarts(planned_s: np.ndarray, cycle_s: float) -> np.ndarray:
+    """
+    Start times when cycles of fixed length run one at a time, in planned order.
+
+    start[i] = max(planned[i], start[i-1] + cycle) unrolls to
+    i*cycle + max_{j<=i}(planned[j] - j*cycle), a single cumulative max.
+    """
+    index = np.arange(len(planned_s)) * cycle_s
+    return np.maximum.accumulate(planned_s - index) + index
+
+
+def analyzeSchedule(matrix, cycle_s: float, unit_s: float = 60.0, late_tolerance_s: float = 1.0,
+                    intended: Optional[np.ndarray] = None) -> Dict:
+    """
+    Simulate the realized schedule of a matrix and report how far it falls behind.
+
+    Returns per-feed lateness, intended vs achieved feed interval per well
+    (row, col), and the total overrun of the run past its planned end.
+    `intended` gives the time each matrix entry was meant for before any
+    stream offsets (matrix units, matrix order; default: the matrix times).
+    Lateness and overrun are reported against both the matrix times and
+    the intended times, so an offset plan cannot hide its own shift.
+    """
+    times, rows, cols = matrixColumns(matrix)
+    intended = times if intended is None else np.asarray(intended, dtype=np.float64)
+    order = np.argsort(times, kind="stable")
+    planned = times[order] * unit_s
+    wanted = intended[order] * unit_s
+    starts = realizedStarts(planned, cycle_s)
+    lateness = starts - planned
+    intended_lateness = starts - wanted
+
+    wells: Dict[Tuple[int, int], Dict[str, float]] = {}
+    well_rows, well_cols = rows[order], cols[order]
+    by_well = np.lexsort((planned, well_cols, well_rows))
+    keys = np.stack([well_rows[by_well], well_cols[by_well]], axis=1)
+    boundaries = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+    for group in np.split(by_well, boundaries):
+        if len(group) == 0:
+            continue
+        well = (int(well_rows[group[0]]), int(well_cols[group[0]]))
+        intended_gaps = np.diff(wanted[group])
+        achieved = np.diff(starts[group])
+        wells[well] = {
+            "feeds": int(len(group)),
+            "intended_interval_s": float(intended_gaps.mean()) if len(intended_gaps) else 0.0,
+            "achieved_interval_s": float(achieved.mean()) if len(achieved) else 0.0,
+            "max_interval_error_s": float(np.abs(achieved - intended_gaps).max()) if len(intended_gaps) else 0.0,
+            "max_lateness_s": float(lateness[group].max()),
+            "max_intended_lateness_s": float(intended_lateness[group].max()),
+        }
+
+    planned_end = float(planned.max() + cycle_s) if len(planned) else 0.0
+    intended_end = float(wanted.max() + cycle_s) if len(wanted) else 0.0
+    actual_end = float(starts[-1] + cycle_s) if len(starts) else 0.0
+    return {
+        "feeds": int(len(planned)),
+        "cycle_s": cycle_s,
+        "lateness_s": lateness,
+        "max_lateness_s": float(lateness.max()) if len(lateness) else 0.0,
+        "mean_lateness_s": float(lateness.mean()) if len(lateness) else 0.0,
+        "late_feeds": int((lateness > late_tolerance_s).sum()),
+        "intended_lateness_s": intended_lateness,
+        "max_intended_lateness_s": float(intended_lateness.max()) if len(intended_lateness) else 0.0,
+        "mean_intended_lateness_s": float(intended_lateness.mean()) if len(intended_lateness) else 0.0,
+        "late_intended_feeds": int((intended_lateness > late_tolerance_s).sum()),
+        "planned_end_s": planned_end,
+        "intended_end_s": intended_end,
+        "actual_end_s": actual_end,
+        "total_overrun_s": actual_end - planned_end,
+        "intended_overrun_s": actual_end - intended_end,
+        "wells": wells,
+    }
+
+
+def formatReport(report: Dict) -> str:
+    """Summarize an analyzeSchedule report in a few lines."""
+    worst = sorted(report["wells"].items(), key=lambda kv: kv[1]["max_interval_error_s"], reverse=True)[:3]
+    lines = [
+        f"{report['feeds']} feeds, {report['cycle_s']:.0f} s per cycle",
+        f"max lateness {report['max_lateness_s'] / 60:.1f} min, mean {report['mean_lateness_s'] / 60:.1f} min, "
+        f"{report['late_feeds']} late feeds",
+        f"against the intended times: max lateness {report['max_intended_lateness_s'] / 60:.1f} min, "
+        f"mean {report['mean_intended_lateness_s'] / 60:.1f} min, {report['late_intended_feeds']} late feeds",
+        f"total overrun {report['total_overrun_s'] / 60:.1f} min "
+        f"({report['intended_overrun_s'] / 60:.1f} min past the intended end)",
+    ]
+    for (row, col), stats in worst:
+        lines.append(
+            f"row {row} col {col}: intended {stats['intended_interval_s'] / 60:.1f} min, "
+            f"achieved {stats['achieved_interval_s'] / 60:.1f} min, worst error {stats['max_interval_error_s'] / 60:.1f} min"
+        )
+    return "\n".join(lines)
+
+
+def planStreamOffsets(streams: Sequence[Sequence[float]], cycle_s: float, resolution_min: float = 0.5,
+                      max_offset_min: Optional[float] = None) -> List[float]:
+    """
+    Choose a start offset (minutes) per feed stream that keeps feeds close to their intended times.
+
+    streams[k] holds the intended times (minutes) of stream k, i.e. one
+    column of one config block, before any offset. Cycles run one at a
+    time in time order, so a feed starts at its intended time plus its
+    stream's offset plus any wait behind earlier cycles; the planner scores
+    an offset by that total deviation from the intended time. Streams are
+    placed most-frequent first, each at the offset on a `resolution_min`
+    grid up to `max_offset_min` (default: one cycle per stream, the backlog
+    of a start where every stream feeds at once) that minimizes the worst
+    deviation of the streams placed so far, then the total, then the offset.
+    The greedy plan is only returned if it beats running every stream
+    unshifted; since waiting cycles are served back to back, offsets can
+    only trade deviation between feeds, never remove it.
+    """
+    cycle_min = cycle_s / 60.0
+    times = [np.sort(np.asarray(s, dtype=np.float64)) for s in streams]
+    if max_offset_min is None:
+        max_offset_min = len(streams) * cycle_min
+    candidates = np.arange(int(max_offset_min / resolution_min + 1e-9) + 1) * resolution_min
+
+    offsets = [0.0] * len(streams)
+    placed_planned = np.zeros(0)
+    placed_intended = np.zeros(0)
+    placed_ids = np.zeros(0, dtype=np.int64)
+    for k in sorted(range(len(streams)), key=lambda k: (-len(times[k]), k)):
+        if len(times[k]) == 0:
+            continue
+        ids = np.concatenate([placed_ids, np.full(len(times[k]), k)])
+        intended = np.concatenate([placed_intended, times[k]])
+        best_score, best = None, 0.0
+        for offset in candidates:
+            planned = np.concatenate([placed_planned, times[k] + offset])
+            order = np.lexsort((ids, planned))   # Equal times run in stream order, as in the matrix
+            deviation = realizedStarts(planned[order], cycle_min) - intended[order]
+            score = (deviation.max(), deviation.sum(), offset)
+            if best_score is None or score < best_score:
+                best_score, best = score, float(offset)
+        offsets[k] = best
+        placed_planned = np.concatenate([placed_planned, times[k] + best])
+        placed_intended, placed_ids = intended, ids
+
+    unshifted = [0.0] * len(streams)
+    if _deviationScore(times, unshifted, cycle_min) <= _deviationScore(times, offsets, cycle_min):
+        return unshifted
+    return offsets
+
+
+def _deviationScore(times: Sequence[np.ndarray], offsets: Sequence[float], cycle_min: float) -> Tuple[float, float]:
+    """(worst, total) minutes between intended times and realized starts for a set of stream offsets."""
+    if not any(len(t) for t in times):
+        return 0.0, 0.0
+    intended = np.concatenate(times)
+    planned = np.concatenate([t + offset for t, offset in zip(times, offsets)])
+    ids = np.concatenate([np.full(len(t), k) for k, t in enumerate(times)])
+    order = np.lexsort((ids, planned))
+    deviation = realizedStarts(planned[order], cycle_min) - intended[order]
+    return float(deviation.max()), float(deviation.sum())
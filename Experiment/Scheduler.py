@@ -0,0 +1,113 @@
+''' Monotonic, heap-based scheduler for experiment protocols '''
+
+from threading import Event
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import datetime
+import heapq
+import time
+
+
+class MonotonicScheduler:
+    """
+    Run items at fixed offsets (seconds) from a single origin on time.monotonic().
+
+    Every deadline is origin + offset, so a late item never shifts the ones
+    after it and wall-clock jumps (NTP, DST) cannot move the schedule. Waits
+    use Event.wait(timeout) for the bulk of the delay and a short yield loop
+    for the final `spin_s`, which keeps start jitter in the low milliseconds.
+    Each dispatched item gets a planned-vs-actual record.
+    """
+
+    def __init__(self, origin: Optional[float] = None, stop_event: Optional[Event] = None,
+                 spin_s: float = 0.002, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.origin = clock() if origin is None else origin
+        self.wall_origin = datetime.datetime.now() - datetime.timedelta(seconds=self.clock() - self.origin)
+        self.stop_event = stop_event if stop_event is not None else Event()
+        self.spin_s = spin_s
+        self.records: List[Dict[str, Any]] = []
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, offset_s: float, item: Any):
+        """Queue an item to run `offset_s` seconds after the origin."""
+        heapq.heappush(self._heap, (offset_s, self._seq, item))
+        self._seq += 1
+
+    def elapsed(self) -> float:
+        """Seconds since the origin."""
+        return self.clock() - self.origin
+
+    def stop(self):
+        """Interrupt any wait in progress and stop dispatching."""
+        self.stop_event.set()
+
+    def isStopped(self) -> bool:
+        return self.stop_event.is_set()
+
+    def waitUntil(self, offset_s: float, interruptible: bool = True) -> bool:
+        """
+        Block until origin + offset_s; returns False if stopped first.
+
+        With interruptible=False the stop event is ignored and the wait always
+        runs to the deadline, for steps that must not be cut short.
+        """
+        deadline = self.origin + offset_s
+        while True:
+            if interruptible and self.stop_event.is_set():
+                return False
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return True
+            if remaining > self.spin_s:
+                if interruptible:
+                    self.stop_event.wait(remaining - self.spin_s)
+                else:
+                    time.sleep(remaining - self.spin_s)
+            else:
+                time.sleep(0)
+
+    def sleep(self, duration_s: float) -> bool:
+        """Wait `duration_s` from now with the same precision as scheduled items."""
+        return self.waitUntil(self.elapsed() + duration_s)
+
+    def wallTime(self, offset_s: float) -> datetime.datetime:
+        """Convert an offset to the wall-clock time it corresponds to for this run."""
+        return self.wall_origin + datetime.timedelta(seconds=offset_s)
+
+    def __iter__(self) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """Yield (item, record) for each item once its deadline has passed, in deadline order."""
+        while self._heap:
+            offset_s, seq, item = self._heap[0]
+            if not self.waitUntil(offset_s):
+                return
+            heapq.heappop(self._heap)
+            yield item, self.record(offset_s, self.elapsed(), seq=seq)
+
+    def record(self, planned_s: float, actual_s: float, **extra) -> Dict[str, Any]:
+        """Store and return a planned-vs-actual record for one dispatched step."""
+        record = {
+            **extra,
+            "planned_s": planned_s,
+            "actual_s": actual_s,
+            "lateness_s": actual_s - planned_s,
+            "planned_time": self.wallTime(planned_s).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            "actual_time": self.wallTime(actual_s).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+        }
+        self.records.append(record)
+        return record
+
+    def summary(self) -> Dict[str, float]:
+        """Lateness statistics over every dispatched item."""
+        lateness = sorted(r["lateness_s"] for r in self.records)
+        if not lateness:
+            return {"dispatched": 0}
+        return {
+            "dispatched": len(lateness),
+            "mean_lateness_s": sum(lateness) / len(lateness),
+            "p50_lateness_s": lateness[len(lateness) // 2],
+            "max_lateness_s": lateness[-1],
+        }
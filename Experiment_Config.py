@@ -39,6 +39,23 @@ VALVE_ID = {
     "outlet": 0
 }
 
+# MUX decoder description: control valve VALVE_ID["mux"][k] is open for the columns in groups[k].
+# Other chips can declare their own tree, e.g. {"valves": [...], "num_columns": 32, "layout": "binary_tree"}.
+MUX_CONFIG = {
+    "valves": VALVE_ID["mux"],
+    "num_columns": 16,
+    "groups": [
+        list(range(1, 9)),                              # columns 1-8
+        list(range(9, 17)),                             # columns 9-16
+        [1, 2, 3, 4, 9, 10, 11, 12],                    # top half
+        [5, 6, 7, 8, 13, 14, 15, 16],                   # bottom half
+        [1, 2, 5, 6, 9, 10, 13, 14],                    # group A
+        [3, 4, 7, 8, 11, 12, 15, 16],                   # group B
+        list(range(1, 17, 2)),                          # odd columns
+        list(range(2, 17, 2)),                          # even columns
+    ],
+}
+
 # TEST MODE
 TEST_MODE = False # Set to True for testing
 
@@ -56,6 +73,7 @@ EXPERIMENT_TIMING_CONFIG = {
     "purgeTime3": 15,
     "prefillTime": 10,
     "feedTime": 10,
+    "primeHoldTime": 30,    # Longest gap (s) an input line counts as primed between feeds of the same input and column
 }
 
 # Optional per-column offset (in minutes) to avoid simultaneous operations
@@ -1,5 +1,8 @@
 """Custom GUI Class for CCC5 Control Application"""
 
+import time
+_IMPORT_START = time.perf_counter()
+
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -14,6 +17,7 @@ from PySide6.QtWidgets import (
     QMessageBox,
     QGridLayout,
     QTextEdit,
+    QPlainTextEdit,
     QLabel,
     QDockWidget,
     QFileDialog,
@@ -22,22 +26,35 @@ from PySide6.QtWidgets import (
     QSpinBox,
 )
 from PySide6.QtCore import Qt, QThreadPool, QMetaObject, QTimer, Signal, QObject, Slot
-from PySide6.QtGui import QPalette, QColor, QIcon, QTextCursor, QKeySequence, QPixmap
-from datetime import datetime
+from PySide6.QtGui import QPalette, QColor, QIcon, QKeySequence, QPixmap
+import logging
 import os
 import json
+import threading
 
 from Connection.Connection import Connection, Device
+from Connection.Hotplug_Monitor import HotplugMonitor
+from Experiment.Metrics_Server import MetricsServer, RunStatus
 from Control.Panel_Controller import ValveController, PumpController
 from UI.Panel_Viewer import ValvePanel, PumpPanel, PortPanel
-from Experiment.CCC5P2_Experiment import ExperimentRunner
-from Experiment.CCC5P2_Prefill import PrefillCoatingRunner
+from UI.Log_Pipeline import LogPipeline
 from Experiment_Config import TEST_MODE, COATING_CONFIG
 
+IMPORT_TIME_S = time.perf_counter() - _IMPORT_START   # Experiment and prefill modules load on first use
+
+GUI_LOG_PATH = os.path.join("logs", "CCC5_GUI.log")
+STATUS_MAX_LINES = 5000         # Oldest status lines are dropped beyond this
+STATUS_REFRESH_MS = 100         # How often queued log lines are moved into the status panel
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.startup_times = {"imports": IMPORT_TIME_S}
+        self._first_paint_pending = True
+        self.devices_ready = threading.Event()
+        self.log_pipeline = LogPipeline(log_path=GUI_LOG_PATH, echo=bool(os.environ.get("CCC5_LOG_ECHO")))
+        self.log_pipeline.start()
         self.main_window()
         self.initialize_controllers()
         self.setup_layout()
@@ -56,12 +73,36 @@ class MainWindow(QMainWindow):
 
     def initialize_controllers(self):
         """Initialize the controllers and panels for the application."""
-        self.control_box = Connection()
+        virtual_rig = os.environ.get("CCC5_VIRTUAL_RIG")
+        if virtual_rig:
+            from Connection.Simulator import VirtualRig
+            port_map = virtual_rig if virtual_rig.endswith(".json") else "Connection/Valve_Port_Map.json"
+            self.control_box = Connection(backend=VirtualRig.fromPortMap(port_map), config_path=port_map)
+        else:
+            self.control_box = Connection()
         print("GUI control_box ID:", id(self.control_box))
-        self.control_box.scanForDevices()
-        self.valve_panel = ValvePanel(
-            logger=self.logMessage, control_box=self.control_box
-        )
+        self.hotplug_monitor = HotplugMonitor(self.control_box)
+        self.control_box.addDeviceListener(self.logDeviceEvent)
+
+        # optional scrape endpoint, e.g. CCC5_METRICS_ADDR=127.0.0.1:9105 or unix:/tmp/ccc5.sock
+        self.run_status = RunStatus()
+        self.metrics_server = None
+        metrics_address = os.environ.get("CCC5_METRICS_ADDR")
+        if metrics_address:
+            self.metrics_server = MetricsServer(self.control_box, self.run_status, metrics_address)
+            try:
+                self.metrics_server.start()
+                self.logMessage(f"Serving metrics on {metrics_address}")
+            except OSError as e:
+                self.logMessage(f"Could not serve metrics on {metrics_address}: {e}", logging.ERROR)
+                self.metrics_server = None
+        if os.environ.get("CCC5_VALVE_GRID") == "painted":
+            from UI.Valve_Grid import ValveGridPanel
+            self.valve_panel = ValveGridPanel(logger=self.logMessage, control_box=self.control_box)
+        else:
+            self.valve_panel = ValvePanel(
+                logger=self.logMessage, control_box=self.control_box
+            )
         self.valve_controller = ValveController(control_box=self.control_box)
 
         # self.pump_controller = PumpController(control_box=self.control_box)
@@ -132,11 +173,16 @@ class MainWindow(QMainWindow):
         status_layout = QVBoxLayout(status_widget)
         status_layout.setContentsMargins(5, 5, 5, 5)
 
-        self.status_box = QTextEdit()
+        self.status_box = QPlainTextEdit()
         self.status_box.setReadOnly(True)
+        self.status_box.setMaximumBlockCount(STATUS_MAX_LINES)
         self.status_box.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         status_layout.addWidget(self.status_box)
 
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.drainLog)
+        self.status_timer.start(STATUS_REFRESH_MS)
+
         status_dock = QDockWidget("Status Log", self)
         status_dock.setWidget(status_widget)
         status_dock.setFloating(False)
@@ -197,16 +243,67 @@ class MainWindow(QMainWindow):
         # )
         # self.addDockWidget(Qt.RightDockWidgetArea, port_dock)
 
+    def showEvent(self, event):
+        """Start device discovery once the window has been painted for the first time."""
+        super().showEvent(event)
+        if self._first_paint_pending:
+            self._first_paint_pending = False
+            QTimer.singleShot(0, self.onFirstPaint)
+
+    def onFirstPaint(self):
+        self.startup_times["first_paint"] = time.perf_counter() - _IMPORT_START
+        threading.Thread(target=self.scanDevices, name="device-scan", daemon=True).start()
+
+    def scanDevices(self):
+        """Discover devices off the GUI thread, reporting progress to the status panel."""
+        self.logMessage("Scanning for devices...")
+        start = time.perf_counter()
+        try:
+            self.control_box.scanForDevices(progress=self.logMessage)
+        except Exception as e:
+            self.logMessage(f"Device scan failed: {e}", logging.ERROR)
+        finally:
+            self.startup_times["device_scan"] = time.perf_counter() - start
+            self.devices_ready.set()
+        self.logMessage(f"Device scan finished: {sum(device.isConnected() for device in self.control_box.devices)} device(s) connected.")
+        self.logMessage(self.startupReport())
+        self.hotplug_monitor.start()
+
+    def logDeviceEvent(self, event: str, device: Device, fields: dict):
+        """Report boards dropping off or coming back on the USB bus (monitor thread)."""
+        if event == "device_lost":
+            self.logMessage(f"{fields['port']} disconnected (valves {fields['valves'][0]}-{fields['valves'][1]})",
+                            logging.WARNING)
+        elif event == "device_restored":
+            self.logMessage(f"{fields['port']} reconnected after {fields.get('outage_s', 0):.1f} s")
+
+    def startupReport(self) -> str:
+        """One-line summary of cold start timings, in seconds."""
+        times = self.startup_times
+        return (f"Startup: imports {times['imports']:.2f} s, first paint {times.get('first_paint', 0):.2f} s, "
+                f"device scan {times.get('device_scan', 0):.2f} s")
+
+    def devicesReady(self) -> bool:
+        """Check if device discovery has finished, logging a note if it has not."""
+        if not self.devices_ready.is_set():
+            self.logMessage("Device scan still in progress, try again in a moment.")
+            return False
+        return True
+
     def runPrefillCoating(self):
         """Run the prefill coating experiment."""
         if hasattr(self, "prefill_runner") and self.prefill_runner and self.prefill_runner.isRunning():
             self.logMessage("Prefill coating is already running.")
             return
 
+        if not self.devicesReady():
+            return
+
         try:
+            from Experiment.CCC5P2_Prefill import PrefillCoatingRunner
             # self.logMessage("Starting prefill coating in background...")
             self.prefill_runner = PrefillCoatingRunner(self, test_mode=TEST_MODE)
-            QThreadPool.globalInstance().start(self.prefill_runner)
+            QThreadPool.globalInstance().start(self.prefill_runner.run)
         except Exception as e:
             import traceback
             tb = traceback.format_exc()
@@ -239,14 +336,24 @@ class MainWindow(QMainWindow):
         if not hasattr(self, "script_code") or not self.script_code:
             self.logMessage("No script loaded.")
             return
+        if not self.devicesReady():
+            return
 
         try:
+            from Experiment.CCC5P2_Experiment import ExperimentRunner, CHECKPOINT_PATH
+            from Experiment.Checkpoint import isResumable, loadCheckpoint
+
             script_globals = {"gui": self}
             exec(self.script_code, script_globals)
 
-            self.logMessage(f"Running {self.loaded_script_path} from script...")
-            runner = ExperimentRunner(self, test_mode=TEST_MODE, time_scale=1)
-            QThreadPool.globalInstance().start(runner)
+            checkpoint = loadCheckpoint(CHECKPOINT_PATH)
+            if isResumable(checkpoint) and self.promptForResume(checkpoint):
+                self.logMessage(f"Resuming run {checkpoint['run_id']}...")
+                runner = ExperimentRunner(self, resume_from=CHECKPOINT_PATH)
+            else:
+                self.logMessage(f"Running {self.loaded_script_path} from script...")
+                runner = ExperimentRunner(self, test_mode=TEST_MODE, time_scale=1)
+            QThreadPool.globalInstance().start(runner.run)
 
         except Exception as e:
             import traceback
@@ -255,16 +362,32 @@ class MainWindow(QMainWindow):
             self.logMessage(tb)
 
     @Slot(str)
-    def logMessage(self, message: str):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[MainWindow] logMessage triggered: {message}")  # Debug print
-        self.status_box.append(f"{timestamp} {message}")
-        self.status_box.moveCursor(QTextCursor.End)
-
-    def _appendToStatus(self, message: str):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.status_box.append(f"{timestamp} {message}")
-        self.status_box.moveCursor(QTextCursor.End)
+    def logMessage(self, message: str, level: int = logging.INFO):
+        """Log a status message; safe to call from any thread."""
+        self.log_pipeline.log(message, level)
+
+    def drainLog(self):
+        """Move queued log lines into the status panel in one append (GUI thread)."""
+        lines = self.log_pipeline.drain()
+        if not lines:
+            return
+        scrollbar = self.status_box.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        self.status_box.appendPlainText("\n".join(lines))
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def promptForResume(self, checkpoint: dict) -> bool:
+        """Ask whether to continue an interrupted run instead of starting a new one."""
+        reply = QMessageBox.question(
+            self,
+            "Resume Experiment",
+            f"Run {checkpoint['run_id']} stopped after {checkpoint['next_feed']} of "
+            f"{checkpoint['total_feeds']} feed cycles. Resume it on its original schedule?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes,
+        )
+        return reply == QMessageBox.Yes
 
     def promptForClose(self):
         """Prompt the user for confirmation before closing the application."""
@@ -276,6 +399,9 @@ class MainWindow(QMainWindow):
             QMessageBox.No,
         )
         if reply == QMessageBox.Yes:
+            self.hotplug_monitor.stop()
+            if self.metrics_server:
+                self.metrics_server.stop()
             self.valve_controller.valveOffAll()
             self.control_box.disconnectAll()
             return True
@@ -285,6 +411,8 @@ class MainWindow(QMainWindow):
         """Handle the close event of the main window."""
         if self.promptForClose():
             print("Closing the application...")
+            self.status_timer.stop()
+            self.log_pipeline.stop()
             event.accept()
         else:
             print("Close event ignored.")
@@ -346,12 +474,7 @@ class MainWindow(QMainWindow):
             return
 
         try:
-            layout_data = {
-                "valves": {
-                    str(valve_id): list(pos)
-                    for valve_id, pos in self.valve_panel.valve_controller.positions.items()
-                }
-            }
+            layout_data = self.valve_panel.layoutData()
             with open(file_name, "w") as f:
                 json.dump(layout_data, f, indent=2)
 
@@ -376,22 +499,9 @@ class MainWindow(QMainWindow):
 
             if "valves" not in layout_data:
                 raise ValueError("Invalid layout file format.")
-            
-            self.valve_panel.resetAllValves()  # Clear existing buttons
 
-            for valve_id_str, position in layout_data["valves"].items():
-                valve_id = int(valve_id_str)
-                row, col = position
-
-                button = self.valve_panel.valve_controller.buttons.get(valve_id)
-                if button:
-                    # Clear old position
-                    old_row, old_col = self.valve_panel.valve_controller.positions[valve_id]
-                    self.valve_panel.slot_grid[(old_row, old_col)].clearSlot()
-                    
-                    # Set to new position
-                    self.valve_panel.slot_grid[(row, col)].setValveButton(button)
-                    self.valve_panel.valve_controller.positions[valve_id] = (row, col)
+            self.valve_panel.resetAllValves()  # Clear existing buttons
+            self.valve_panel.applyLayout(layout_data)
 
             self.logMessage(f"Valve layout loaded from: {file_name}")
 
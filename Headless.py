@@ -0,0 +1,119 @@
+"""Command-line runner for CCC5 protocols on machines without Qt"""
+
+import time
+_START = time.perf_counter()
+
+import argparse
+import logging
+import signal
+import sys
+import threading
+
+from Connection.Connection_Core import ConnectionCore
+from Connection.Hotplug_Monitor import HotplugMonitor
+from Experiment.Metrics_Server import MetricsServer, RunStatus
+from UI.Log_Pipeline import LogPipeline
+from Experiment_Config import TEST_MODE
+
+DEFAULT_PORT_MAP = "Connection/Valve_Port_Map.json"
+
+
+def parseArgs(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run CCC5 prefill coating or the CCC5P2 experiment without the GUI.")
+    parser.add_argument("protocol", choices=("prefill", "experiment"), help="Protocol to run")
+    parser.add_argument("--port-map", default=DEFAULT_PORT_MAP, help="Valve port map JSON")
+    parser.add_argument("--sim", action="store_true", help="Use simulated boards built from the port map")
+    parser.add_argument("--test-mode", action="store_true", default=TEST_MODE, help="Use the shortened test timings")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Scale the experiment matrix times (e.g. 0.01 for a quick dry run)")
+    parser.add_argument("--delay-min", type=float, default=0, help="Delay before the first feed, in minutes")
+    parser.add_argument("--resume", nargs="?", const="", metavar="CHECKPOINT",
+                        help="Resume an interrupted experiment (default checkpoint if no path is given)")
+    parser.add_argument("--checkpoint", help="Checkpoint file for a new experiment run")
+    parser.add_argument("--missed-policy", choices=("skip", "run", "compress"), default="skip",
+                        help="What to do with cycles missed while the run was down")
+    parser.add_argument("--log-file", help="Status log file (rotated); messages always go to stdout")
+    parser.add_argument("--run-log", help="Event log (JSON Lines) path for a new experiment run")
+    parser.add_argument("--metrics", metavar="ADDR", help="Serve /metrics and /status on host:port or unix:/path")
+    parser.add_argument("--metrics-interval", type=float, help="Also dump serial I/O counters to the run log every N s")
+    parser.add_argument("--no-hotplug", action="store_true", help="Do not reconnect boards that drop off the bus")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log debug messages")
+    return parser.parse_args(argv)
+
+
+def openConnection(args) -> ConnectionCore:
+    if args.sim:
+        from Connection.Simulator import VirtualRig
+        return ConnectionCore(backend=VirtualRig.fromPortMap(args.port_map), config_path=args.port_map)
+    return ConnectionCore(config_path=args.port_map)
+
+
+def main(argv=None) -> int:
+    args = parseArgs(argv)
+    log = LogPipeline(level=logging.DEBUG if args.verbose else logging.INFO, log_path=args.log_file, echo=True)
+    log.start()
+    stop_event = threading.Event()
+
+    def interrupt(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        if args.protocol == "experiment":
+            log.warning("Stopping after the current feed cycle and its purge (Ctrl+C again to abort)...")
+        else:
+            log.warning("Stopping prefill coating (Ctrl+C again to abort)...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, interrupt)
+    signal.signal(signal.SIGTERM, interrupt)
+
+    connection = openConnection(args)
+    import_s = time.perf_counter() - _START
+    scan_start = time.perf_counter()
+    connection.scanForDevices(progress=log.debug)
+    connected = sum(device.isConnected() for device in connection.devices)
+    log.log(f"Startup: imports {import_s:.2f} s, device scan {time.perf_counter() - scan_start:.2f} s, "
+            f"{connected} device(s) connected")
+
+    monitor = None if args.no_hotplug else HotplugMonitor(connection)
+    connection.addDeviceListener(lambda event, device, fields: log.warning(f"{event}: {fields}"))
+    status = RunStatus()
+    server = MetricsServer(connection, status, args.metrics) if args.metrics else None
+    try:
+        if monitor:
+            monitor.start()
+        if server:
+            server.start()
+            log.log(f"Serving metrics on {args.metrics}")
+
+        if args.protocol == "prefill":
+            from Experiment.CCC5P2_Prefill import runPrefillCoating
+            runPrefillCoating(connection, scr_update=log.log, stop_event=stop_event, test_mode=args.test_mode)
+        elif args.resume is not None:
+            from Experiment.CCC5P2_Experiment import CHECKPOINT_PATH, resumeExperiment
+            resumeExperiment(connection, checkpoint_path=args.resume or CHECKPOINT_PATH, log_fn=log.log,
+                             missed_policy=args.missed_policy, metrics_interval_s=args.metrics_interval,
+                             status=status, stop_event=stop_event)
+        else:
+            from Experiment.CCC5P2_Experiment import CHECKPOINT_PATH, runExperiment
+            runExperiment(connection, log_fn=log.log, delay_min=args.delay_min, test_mode=args.test_mode,
+                          time_scale=args.time_scale, checkpoint_path=args.checkpoint or CHECKPOINT_PATH,
+                          log_path=args.run_log, metrics_interval_s=args.metrics_interval,
+                          status=status, stop_event=stop_event)
+        return 1 if stop_event.is_set() else 0
+    except KeyboardInterrupt:
+        log.error("Aborted.")
+        return 130
+    except Exception as e:
+        log.exception(f"{args.protocol} failed: {e}")
+        return 1
+    finally:
+        if server:
+            server.stop()
+        if monitor:
+            monitor.stop()
+        connection.disconnectAll()
+        log.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+''' Thread-safe, batched log pipeline for the status panel and log file '''
+
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+import logging
+import os
+import queue
+import sys
+
+LOG_FORMAT = "%(asctime)s %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class _PanelHandler(logging.Handler):
+    """Collects formatted lines for the GUI to pick up; emit() runs on the listener thread."""
+
+    def __init__(self, max_pending: int):
+        super().__init__()
+        self.lines: deque = deque(maxlen=max_pending)
+
+    def emit(self, record: logging.LogRecord):
+        self.lines.append(self.format(record))
+
+
+class LogPipeline:
+    """
+    One queue that every thread can log into, fanned out off the caller's thread.
+
+    log() checks the level first (a disabled message costs one comparison),
+    then puts the record on a queue via logging.QueueHandler. A
+    QueueListener thread formats each record once and hands it to the
+    rotating log file, optionally stdout, and a bounded buffer that the GUI
+    empties with drain() on a timer. No caller ever touches a widget.
+    """
+
+    def __init__(self, name: str = "CCC5", level: int = logging.INFO, log_path: Optional[str] = None,
+                 max_bytes: int = 5 * 1024 * 1024, backup_count: int = 5, echo: bool = False,
+                 max_pending: int = 10000):
+        self.logger = logging.getLogger(name)
+        self.logger.propagate = False
+        self.logger.handlers.clear()
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.logger.addHandler(QueueHandler(self.queue))
+        self.log_path = log_path
+
+        formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+        self.panel = _PanelHandler(max_pending)
+        handlers: List[logging.Handler] = [self.panel]
+        if log_path:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handlers.append(RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding="utf-8", delay=True))
+        if echo:
+            handlers.append(logging.StreamHandler(sys.stdout))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._started = False
+        self.setLevel(level)
+
+    def setLevel(self, level: int):
+        """Drop messages below `level` before they reach the queue."""
+        self.level = level
+        self.logger.setLevel(level)
+
+    def log(self, message: str, level: int = logging.INFO):
+        """Queue a message from any thread."""
+        if level >= self.level:
+            self.logger.log(level, message)
+
+    def debug(self, message: str):
+        self.log(message, logging.DEBUG)
+
+    def warning(self, message: str):
+        self.log(message, logging.WARNING)
+
+    def error(self, message: str):
+        self.log(message, logging.ERROR)
+
+    def exception(self, message: str):
+        """Log an error with the traceback of the exception being handled."""
+        if logging.ERROR >= self.level:
+            self.logger.exception(message)
+
+    def start(self):
+        if not self._started:
+            self.listener.start()
+            self._started = True
+
+    def stop(self):
+        """Write out everything still queued and close the log file."""
+        if self._started:
+            self.listener.stop()
+            self._started = False
+        for handler in self.listener.handlers:
+            handler.close()
+
+    def drain(self, max_lines: int = 1000) -> List[str]:
+        """Take up to `max_lines` formatted lines for the status panel (GUI thread)."""
+        lines = []
+        pending = self.panel.lines
+        while pending and len(lines) < max_lines:
+            lines.append(pending.popleft())
+        return lines
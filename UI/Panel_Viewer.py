@@ -8,7 +8,7 @@ import math
 
 
 from Connection.Connection import Connection
-from Control.Panel_Controller import ValveController, PumpController
+from Control.Panel_Controller import ValveController, PumpController, VALVE_BUTTON_NAME
 from Experiment_Config import (
     NUM_TOTAL_VALVES
 )
@@ -42,10 +42,10 @@ class ValvePanel(QWidget):
     def __init__(self, valve_panel=None, logger=None, control_box=None):
         super().__init__()
         self.logger = logger
-        self.setStyleSheet("background-color: black; color: white;")
         
         self.control_box = control_box
         self.valve_controller = ValveController(self, logger=self.logger, control_box=self.control_box)
+        self.setStyleSheet("QWidget { background-color: black; color: white; }\n" + self.valve_controller.buttonStyleSheet())
         
         valve_panel_layout = QVBoxLayout()
 
@@ -108,7 +108,7 @@ class ValvePanel(QWidget):
                 btn.setEnabled(True)
                 btn.setVisible(True)
                 btn.setMinimumSize(75, 50)
-                btn.setStyleSheet(f"color: black; background-color: {self.valve_controller.btn_off_color};")
+                btn.setObjectName(VALVE_BUTTON_NAME)
                 btn.toggled.connect(self.handleValveToggle)
 
                 self.slot_grid[(i, j)].setValveButton(btn)
@@ -171,6 +171,28 @@ class ValvePanel(QWidget):
 
         self.valve_controller.buttons[valve_id] = button
 
+    def layoutData(self) -> dict:
+        """Current positions in the valve layout JSON format."""
+        return {"valves": {str(valve_id): list(pos) for valve_id, pos in self.valve_controller.positions.items()}}
+
+    def applyLayout(self, layout_data: dict):
+        """Move valve buttons to the positions of a valve layout JSON document."""
+        if "valves" not in layout_data:
+            raise ValueError("Invalid layout file format.")
+        for valve_id_str, position in layout_data["valves"].items():
+            valve_id = int(valve_id_str)
+            row, col = position
+
+            button = self.valve_controller.buttons.get(valve_id)
+            if button:
+                # Clear old position
+                old_row, old_col = self.valve_controller.positions[valve_id]
+                self.slot_grid[(old_row, old_col)].clearSlot()
+
+                # Set to new position
+                self.slot_grid[(row, col)].setValveButton(button)
+                self.valve_controller.positions[valve_id] = (row, col)
+
     def resetAllValves(self):
         """Reset all valves to their default state and position."""
         for slot in self.slot_grid.values():
@@ -180,7 +202,6 @@ class ValvePanel(QWidget):
             button.setEnabled(True)
             button.setChecked(False)
             button.setText(f"{valve_id} - CLOSE")
-            button.setStyleSheet(f"color: black; background-color: {self.valve_controller.btn_off_color};")
 
             row, col = divmod(valve_id, self.cols)
             self.slot_grid[(row, col)].setValveButton(button)
@@ -189,7 +210,6 @@ class ValvePanel(QWidget):
             button.setEnabled(True)
             button.setChecked(False)
             button.setText(f"{valve_id} - CLOSE")
-            button.setStyleSheet(f"color: black; background-color: {self.valve_controller.btn_off_color};")
 
             row, col = divmod(valve_id, self.cols)
             self.slot_grid[(row, col)].setValveButton(button)
@@ -209,7 +229,6 @@ class ValvePanel(QWidget):
             button.setEnabled(True)
             button.setVisible(True)
             button.setText(f"{valve_id} - CLOSE")
-            button.setStyleSheet(f"color: black; background-color: {self.valve_controller.btn_off_color};")
             self.valve_controller.positions[valve_id] = (default_row, default_col)
 
         self.updateStatus("All valves reset.")    
@@ -0,0 +1,305 @@
+''' Custom-painted valve grid: one widget for any number of valves '''
+
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QMenu, QInputDialog, QApplication, \
+    QScrollArea
+from PySide6.QtCore import Qt, QTimer, QRect, QPoint, Slot
+from PySide6.QtGui import QPainter, QColor, QPen
+from typing import Dict, Optional, Tuple
+import threading
+
+from Control.Panel_Controller import REFRESH_INTERVAL_MS
+from Experiment_Config import NUM_TOTAL_VALVES
+
+Cell = Tuple[int, int]
+
+
+class ValveGrid(QWidget):
+    """
+    Every valve drawn by a single widget instead of one QPushButton per valve.
+
+    Valve state changes may arrive from any thread; like ValveController they
+    are coalesced to the latest state per valve and applied on a ~30 Hz timer,
+    which invalidates only the cells that changed. Clicking a cell toggles its
+    valve, dragging moves it to another cell (swapping with any valve already
+    there) and right-clicking offers Delete and Move.
+    """
+
+    def __init__(self, control_box, logger=None, rows: int = 21, cols: int = 12,
+                 num_valves: int = NUM_TOTAL_VALVES, cell_width: int = 75, cell_height: int = 30):
+        super().__init__()
+        self.control_box = control_box
+        self.logger = logger
+        self.rows = rows
+        self.cols = cols
+        self.num_valves = num_valves
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.off_color = QColor(255, 255, 55)     # Yellow for "CLOSED"
+        self.on_color = QColor(36, 250, 7)        # Green for "OPEN"
+        self.background = QColor(0, 0, 0)
+
+        self.states: Dict[int, bool] = {}
+        self.positions: Dict[int, Cell] = {}      # valve_id -> (row, col)
+        self.cells: Dict[Cell, int] = {}          # (row, col) -> valve_id
+        self.deleted = set()
+
+        self._pending: Dict[int, bool] = {}
+        self._pending_lock = threading.Lock()
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refreshCells)
+        self.refresh_timer.start(REFRESH_INTERVAL_MS)
+
+        self._press_pos: Optional[QPoint] = None
+        self._press_valve: Optional[int] = None
+        self._drag_valve: Optional[int] = None
+        self._drag_pos: Optional[QPoint] = None
+
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.resetPositions()
+        self.control_box.valveStatesChanged.connect(self.updateValveStates)
+
+    # --- geometry ---
+    def resizeGrid(self, rows: int, cols: int):
+        self.rows, self.cols = rows, cols
+        self.setFixedSize(cols * self.cell_width, rows * self.cell_height)
+        self.update()
+
+    def cellRect(self, cell: Cell) -> QRect:
+        row, col = cell
+        return QRect(col * self.cell_width, row * self.cell_height, self.cell_width, self.cell_height)
+
+    def cellAt(self, pos: QPoint) -> Optional[Cell]:
+        row, col = pos.y() // self.cell_height, pos.x() // self.cell_width
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def valveAt(self, pos: QPoint) -> Optional[int]:
+        cell = self.cellAt(pos)
+        return self.cells.get(cell) if cell else None
+
+    def updateValve(self, valve_id: int):
+        """Schedule a repaint of one valve's cell."""
+        cell = self.positions.get(valve_id)
+        if cell:
+            self.update(self.cellRect(cell))
+
+    # --- layout ---
+    def placeValve(self, valve_id: int, cell: Cell):
+        """Put a valve in a cell, swapping with the valve already there."""
+        old_cell = self.positions.get(valve_id)
+        other = self.cells.get(cell)
+        if other is not None and other != valve_id:
+            if old_cell is not None:
+                self.positions[other] = old_cell
+                self.cells[old_cell] = other
+            else:
+                del self.positions[other]
+        elif old_cell is not None:
+            del self.cells[old_cell]
+        self.positions[valve_id] = cell
+        self.cells[cell] = valve_id
+        if cell[0] >= self.rows or cell[1] >= self.cols:
+            self.resizeGrid(max(self.rows, cell[0] + 1), max(self.cols, cell[1] + 1))
+        for changed in (old_cell, cell):
+            if changed is not None:
+                self.update(self.cellRect(changed))
+
+    def deleteValve(self, valve_id: int):
+        cell = self.positions.pop(valve_id, None)
+        if cell is not None:
+            del self.cells[cell]
+            self.deleted.add(valve_id)
+            self.update(self.cellRect(cell))
+
+    def resetPositions(self):
+        """Put every valve back in its default cell (row-major by valve ID)."""
+        self.positions.clear()
+        self.cells.clear()
+        self.deleted.clear()
+        for valve_id in range(self.num_valves):
+            cell = divmod(valve_id, self.cols)
+            self.positions[valve_id] = cell
+            self.cells[cell] = valve_id
+        self.resizeGrid(max(self.rows, (self.num_valves - 1) // self.cols + 1), self.cols)
+
+    def layoutData(self) -> dict:
+        """Current positions in the valve layout JSON format."""
+        return {"valves": {str(valve_id): list(cell) for valve_id, cell in self.positions.items()}}
+
+    def applyLayout(self, layout_data: dict):
+        """Move valves to the positions of a valve layout JSON document."""
+        if "valves" not in layout_data:
+            raise ValueError("Invalid layout file format.")
+        for valve_id_str, position in layout_data["valves"].items():
+            valve_id = int(valve_id_str)
+            if valve_id in self.positions:
+                self.placeValve(valve_id, tuple(position))
+
+    # --- valve state ---
+    @Slot(object)
+    def updateValveStates(self, states: Dict[int, bool]):
+        """Record valve changes; safe from any thread."""
+        with self._pending_lock:
+            self._pending.update(states)
+
+    def refreshCells(self):
+        """Apply pending valve changes and repaint only their cells (GUI thread)."""
+        if not self._pending:
+            return
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for valve_id, state in pending.items():
+            if self.states.get(valve_id, False) != state:
+                self.states[valve_id] = state
+                self.updateValve(valve_id)
+
+    def toggleValve(self, valve_id: int):
+        state = not self.states.get(valve_id, False)
+        self.states[valve_id] = state
+        self.updateValve(valve_id)
+        self.control_box.setValveState(valve_id, state)
+
+    def setAllValves(self, state: bool):
+        """Open or close every valve shown in the grid with one batched write."""
+        changes = {valve_id: state for valve_id in self.positions if self.states.get(valve_id, False) != state}
+        for valve_id in changes:
+            self.states[valve_id] = state
+            self.updateValve(valve_id)
+        if changes:
+            self.control_box.setValveStates(changes)
+
+    def valveOnAll(self):
+        self.setAllValves(True)
+
+    def valveOffAll(self):
+        self.setAllValves(False)
+
+    # --- painting ---
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        dirty = event.rect()
+        painter.fillRect(dirty, self.background)
+        first_row = max(0, dirty.top() // self.cell_height)
+        last_row = min(self.rows - 1, dirty.bottom() // self.cell_height)
+        first_col = max(0, dirty.left() // self.cell_width)
+        last_col = min(self.cols - 1, dirty.right() // self.cell_width)
+
+        painter.setPen(QPen(QColor(0, 0, 0)))
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                valve_id = self.cells.get((row, col))
+                if valve_id is None:
+                    continue
+                rect = self.cellRect((row, col)).adjusted(1, 1, -1, -1)
+                state = self.states.get(valve_id, False)
+                painter.fillRect(rect, self.on_color if state else self.off_color)
+                if valve_id == self._drag_valve:
+                    painter.fillRect(rect, QColor(0, 0, 0, 90))
+                painter.drawText(rect, Qt.AlignCenter, f"{valve_id} - {'OPEN' if state else 'CLOSE'}")
+
+        if self._drag_valve is not None and self._drag_pos is not None:
+            target = self.cellAt(self._drag_pos)
+            if target:
+                painter.setPen(QPen(QColor(255, 255, 255), 2))
+                painter.drawRect(self.cellRect(target).adjusted(1, 1, -2, -2))
+
+    # --- mouse ---
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._press_pos = event.position().toPoint()
+            self._press_valve = self.valveAt(self._press_pos)
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self._press_valve is None or not (event.buttons() & Qt.LeftButton):
+            return
+        pos = event.position().toPoint()
+        if self._drag_valve is None:
+            if (pos - self._press_pos).manhattanLength() < QApplication.startDragDistance():
+                return
+            self._drag_valve = self._press_valve
+        previous = self.cellAt(self._drag_pos) if self._drag_pos is not None else None
+        self._drag_pos = pos
+        for cell in (previous, self.cellAt(pos), self.positions.get(self._drag_valve)):
+            if cell:
+                self.update(self.cellRect(cell))
+
+    def mouseReleaseEvent(self, event):
+        if event.button() != Qt.LeftButton:
+            return
+        pos = event.position().toPoint()
+        if self._drag_valve is not None:
+            valve_id, target = self._drag_valve, self.cellAt(pos)
+            previous = self.cellAt(self._drag_pos) if self._drag_pos is not None else None
+            self._drag_valve = self._drag_pos = None
+            if previous:
+                self.update(self.cellRect(previous))
+            if target:
+                self.placeValve(valve_id, target)
+            self.updateValve(valve_id)
+        elif self._press_valve is not None and self._press_valve == self.valveAt(pos):
+            self.toggleValve(self._press_valve)
+        self._press_pos = self._press_valve = None
+
+    def contextMenuEvent(self, event):
+        valve_id = self.valveAt(event.pos())
+        if valve_id is None:
+            return
+        menu = QMenu(self)
+        delete_action = menu.addAction("Delete")
+        move_action = menu.addAction("Move")
+        action = menu.exec_(event.globalPos())
+
+        if action == delete_action:
+            self.deleteValve(valve_id)
+        elif action == move_action:
+            row, ok1 = QInputDialog.getInt(self, "Move Valve", f"New Row (1-{self.rows}):", 1, 1, self.rows)
+            col, ok2 = QInputDialog.getInt(self, "Move Valve", f"New Column (1-{self.cols}):", 1, 1, self.cols)
+            if ok1 and ok2:
+                self.placeValve(valve_id, (row - 1, col - 1))
+
+
+class ValveGridPanel(QWidget):
+    """Drop-in alternative to ValvePanel built on the custom-painted ValveGrid."""
+
+    def __init__(self, logger=None, control_box=None):
+        super().__init__()
+        self.logger = logger
+        self.control_box = control_box
+        self.setStyleSheet("QWidget { background-color: black; color: white; }")
+
+        layout = QVBoxLayout(self)
+        self.grid = ValveGrid(control_box, logger=logger)
+        scroll = QScrollArea()
+        scroll.setWidget(self.grid)
+        scroll.setWidgetResizable(False)
+        layout.addWidget(scroll)
+
+        control_all_layout = QHBoxLayout()
+        for text, slot in (("All Valves - OPEN", self.grid.valveOnAll),
+                           ("All Valves - CLOSE", self.grid.valveOffAll),
+                           ("Reset All Valves", self.resetAllValves)):
+            button = QPushButton(text)
+            button.setFixedSize(200, 30)
+            button.setStyleSheet("color: black; background-color: lightgrey;")
+            button.clicked.connect(slot)
+            control_all_layout.addWidget(button)
+        layout.addLayout(control_all_layout)
+
+    def layoutData(self) -> dict:
+        return self.grid.layoutData()
+
+    def applyLayout(self, layout_data: dict):
+        self.grid.applyLayout(layout_data)
+
+    def resetAllValves(self):
+        """Reset all valves to closed and to their default positions."""
+        self.grid.resetPositions()
+        self.grid.valveOffAll()
+        self.updateStatus("All valves reset.")
+
+    def updateStatus(self, message):
+        """Update the status log with a new message."""
+        if self.logger:
+            self.logger(message)
@@ -0,0 +1,26 @@
+''' Valve state and listener behaviour of the Qt-free connection core '''
+
+import os
+
+from Connection.Connection_Core import ConnectionCore
+from Connection.Simulator import VirtualRig
+
+PORT_MAP = os.path.join(os.path.dirname(__file__), "..", "Connection", "Valve_Port_Map.json")
+
+
+def test_scan_reports_the_reset_of_valves_toggled_before_their_board_was_found():
+    rig = VirtualRig.fromPortMap(PORT_MAP)
+    connection = ConnectionCore(backend=rig, config_path=PORT_MAP)
+    shown = {}
+    connection.addValveListener(shown.update)
+    try:
+        connection.setValveState(31, True)   # Clicked in the panel while the scan is still running
+        assert shown[31]
+        connection.scanForDevices()
+        assert connection.waitForWrites(2.0)
+    finally:
+        connection.disconnectAll()
+
+    assert not connection.getValveState(31)
+    assert shown[31] is False
+    assert rig.valveStates()[31] is False
@@ -0,0 +1,62 @@
+''' Event log continuity across a stopped and resumed experiment run '''
+
+from collections import Counter
+from threading import Event
+import os
+
+from Connection.Connection_Core import ConnectionCore
+from Connection.Simulator import VirtualRig
+from Experiment.CCC5P2_Experiment import generateExperimentMatrix, resumeExperiment, runExperimentMatrix, \
+    saveExperimentMatrixToJson
+from Experiment.Checkpoint import isResumable, loadCheckpoint
+from Experiment.Event_Log import readEvents, readIndex
+
+PORT_MAP = os.path.join(os.path.dirname(__file__), "..", "Connection", "Valve_Port_Map.json")
+
+
+def test_resumed_run_keeps_sidecar_in_step_with_log(tmp_path):
+    connection = ConnectionCore(backend=VirtualRig.fromPortMap(PORT_MAP), config_path=PORT_MAP)
+    connection.scanForDevices()
+    matrix = generateExperimentMatrix(time_scale=1 / 100)[:6]
+    matrix_path = str(tmp_path / "matrix.json")
+    saveExperimentMatrixToJson(matrix_path, matrix)
+    log_path = str(tmp_path / "run.jsonl")
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+
+    stop_event = Event()
+    feeds = []
+    messages = []
+
+    def stop_after_two_feeds(message):
+        messages.append(message)
+        if "Feed Input Valve" in message:
+            feeds.append(message)
+            if len(feeds) == 2:
+                stop_event.set()
+
+    try:
+        stopped = runExperimentMatrix(connection, matrix, delay_min=0, test_mode=True, log_fn=stop_after_two_feeds,
+                                      log_path=log_path, checkpoint_path=checkpoint_path, matrix_path=matrix_path,
+                                      stop_event=stop_event)
+        assert isResumable(loadCheckpoint(checkpoint_path))
+        assert stopped["metadata"]["stopped"]
+        assert f"Experiment stopped at cycle 2 of {len(matrix)}. Closing all valves..." in messages
+        assert not any("completed" in message for message in messages)
+        resumed = resumeExperiment(connection, checkpoint_path=checkpoint_path, log_fn=lambda message: None,
+                                   missed_policy="compress")
+        assert not resumed["metadata"]["stopped"]
+        assert not isResumable(loadCheckpoint(checkpoint_path))
+    finally:
+        connection.disconnectAll()
+
+    records = list(readEvents(log_path))
+    sidecar = readIndex(log_path)
+    assert sidecar["records"] == len(records)
+    assert sidecar["counts"] == dict(Counter(record["event"] for record in records))
+    assert sidecar["counts"]["run_start"] == 1
+    assert sidecar["counts"]["resume"] == 1
+    assert sidecar["first_t"] == records[0]["t"]
+    assert sidecar["bytes"] == os.path.getsize(log_path)
+    assert sidecar["summary"]["experiment_name"]
+    assert sidecar["summary"]["run_id"] == records[0]["run_id"]
+    assert "end_time" in sidecar["summary"]
@@ -0,0 +1,41 @@
+''' Coalescing matrix entries into shared feed cycles and running compiled programs '''
+
+import os
+
+from Connection.Connection_Core import ConnectionCore
+from Connection.Simulator import VirtualRig
+from Experiment.CCC5P2_Experiment import compileExperimentProgram, generateExperimentMatrix
+from Experiment.Frame_Program import coalesceEntries, executeProgram
+from Experiment.Scheduler import MonotonicScheduler
+
+PORT_MAP = os.path.join(os.path.dirname(__file__), "..", "Connection", "Valve_Port_Map.json")
+
+
+def test_coalesced_wells_keep_their_own_planned_time():
+    entries = [(0.0, 0, 1, 1, 2, 2), (30.0, 1, 1, 2, 2, 2), (50.0, 2, 3, 1, 4, 2), (90.0, 3, 1, 3, 2, 2)]
+    groups = coalesceEntries(entries, window_s=60)
+    assert [(planned_s, input_valve, col) for planned_s, input_valve, col, _ in groups] == [(0.0, 1, 2), (50.0, 3, 4),
+                                                                                             (90.0, 1, 2)]
+    assert groups[0][3] == [(0, 1, 2, 0.0), (1, 2, 2, 30.0)]
+
+
+def test_stop_mid_cycle_finishes_the_purge_and_starts_nothing_new():
+    connection = ConnectionCore(backend=VirtualRig.fromPortMap(PORT_MAP), config_path=PORT_MAP)
+    connection.scanForDevices()
+    program = compileExperimentProgram(generateExperimentMatrix(time_scale=1 / 100)[:3], 0, False, True)
+    scheduler = MonotonicScheduler()
+    sent = []
+
+    def stop_while_feeding(feed, frame):
+        sent.append((feed.entry_index, frame.label))
+        if frame.label == "Feed chambers":
+            scheduler.stop()
+
+    try:
+        done = [feed for feed, _ in executeProgram(connection, program, scheduler, on_frame=stop_while_feeding)]
+    finally:
+        connection.disconnectAll()
+
+    first = program.feeds[0]
+    assert done == [first]
+    assert sent == [(first.entry_index, frame.label) for frame in first.frames]
@@ -0,0 +1,60 @@
+''' Reconnecting a dropped board without stalling the boards that stayed connected '''
+
+import os
+import time
+
+from Connection.Connection_Core import ConnectionCore
+from Connection.Hotplug_Monitor import HotplugMonitor
+from Connection.Simulator import VirtualRig
+
+PORT_MAP = os.path.join(os.path.dirname(__file__), "..", "Connection", "Valve_Port_Map.json")
+
+
+def test_slow_reopen_does_not_block_commits_to_other_boards():
+    rig = VirtualRig.fromPortMap(PORT_MAP)
+    connection = ConnectionCore(backend=rig, config_path=PORT_MAP)
+    connection.scanForDevices()
+    events = []
+    connection.addDeviceListener(lambda event, device, fields: events.append((event, fields)))
+    monitor = HotplugMonitor(connection)
+    try:
+        monitor.start()
+        rig.unplug("COM6")
+        time.sleep(0.5)
+        rig.setOpenDelay("COM6", 1.0)
+        rig.plug("COM6")
+
+        worst = 0.0
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            connection.setValveState(31, not connection.getValveState(31))   # COM7 stayed connected
+            worst = max(worst, time.perf_counter() - start)
+            time.sleep(0.01)
+        assert connection.waitForWrites(2.0)
+    finally:
+        monitor.stop()
+        connection.disconnectAll()
+
+    assert worst < 0.5
+    assert [event for event, _ in events] == ["device_lost", "device_restored"]
+    assert events[1][1]["outage_s"] >= 1.0
+    assert rig.valveStates() == {valve: connection.getValveState(valve) for valve in rig.valveStates()}
+
+
+def test_port_that_outlasts_the_scan_gets_its_state_replayed():
+    rig = VirtualRig.fromPortMap(PORT_MAP)
+    rig.setOpenDelay("COM6", 0.3)   # Inverted polarity: its all-zero init bytes mean every valve open
+    connection = ConnectionCore(backend=rig, config_path=PORT_MAP)
+    try:
+        connection.scanForDevices(port_timeout=0.1)
+        device = connection.devices_by_hwid[next(hwid for hwid, d in connection.devices_by_hwid.items()
+                                                 if d.port_info.device == "COM6")]
+        assert device in connection.devices
+        board = rig.boards["COM6"]
+        deadline = time.monotonic() + 2.0
+        while not (device.isConnected() and board.initialized[0] and not any(board.valveStates().values())):
+            assert time.monotonic() < deadline, "late connect was not replayed"
+            time.sleep(0.01)
+    finally:
+        connection.disconnectAll()
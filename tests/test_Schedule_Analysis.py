@@ -0,0 +1,25 @@
+''' Schedule analysis and offset planning measured against the intended feed times '''
+
+from Experiment.CCC5P2_Experiment import analyzeExperimentSchedule, experimentStreams, generateExperimentMatrix, \
+    planExperimentOffsets
+from Experiment.Schedule_Analysis import analyzeSchedule
+
+
+def test_stream_offset_counts_as_lateness_against_intended_times():
+    matrix = [[30.0, 46, 1, 1, 2, 0], [90.0, 46, 1, 1, 2, 0]]   # One stream shifted by 30 min
+    report = analyzeSchedule(matrix, cycle_s=61, intended=[0.0, 60.0])
+    assert report["max_lateness_s"] == 0
+    assert report["total_overrun_s"] == 0
+    assert report["max_intended_lateness_s"] == 30 * 60
+    assert report["intended_overrun_s"] == 30 * 60
+    assert report["wells"][(1, 1)]["intended_interval_s"] == 60 * 60
+
+
+def test_planned_offsets_do_not_trade_intended_lateness_for_shifted_lateness():
+    offsets = planExperimentOffsets()
+    assert len(offsets) == len(experimentStreams())
+    assert max(offsets) <= len(offsets) * 61 / 60
+    planned = analyzeExperimentSchedule(generateExperimentMatrix(offsets=offsets), offsets=offsets)
+    stock = analyzeExperimentSchedule(generateExperimentMatrix())
+    assert planned["max_intended_lateness_s"] <= stock["max_intended_lateness_s"]
+    assert planned["intended_overrun_s"] <= stock["intended_overrun_s"]
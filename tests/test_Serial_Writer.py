@@ -0,0 +1,61 @@
+''' SerialWriter behaviour on short writes and restarts '''
+
+import os
+import threading
+import time
+
+from Connection.Connection_Core import ConnectionCore
+from Connection.Simulator import VirtualRig
+
+PORT_MAP = os.path.join(os.path.dirname(__file__), "..", "Connection", "Valve_Port_Map.json")
+
+
+def connectRig():
+    rig = VirtualRig.fromPortMap(PORT_MAP)
+    connection = ConnectionCore(backend=rig, config_path=PORT_MAP)
+    connection.scanForDevices()
+    return rig, connection
+
+
+def test_short_write_resends_tail_and_counts_accepted_bytes():
+    rig, connection = connectRig()
+    try:
+        device = next(d for d in connection.devices if d.isConnected())
+        port = device.serial_port
+        port.max_write = 2
+        bytes_before, calls_before = port.bytes_written, port.write_calls
+        before = device.metrics.snapshot()
+        valves = [device.start_number + i for i in (0, 9, 18)]   # One valve per bank: a multi-bank frame
+        connection.apply({valve: True for valve in valves})
+        assert connection.waitForWrites(2.0)
+
+        board = rig.boards[device.port_info.device]
+        assert all(rig.valveStates()[valve] for valve in valves)
+        received = b"".join(data for _, data in board.frames[-3:])
+        assert received[0::2] == b"ABC"   # The three 2-byte chunks reassemble one whole frame
+        snapshot = device.metrics.snapshot()
+        assert snapshot["bytes_written"] - before["bytes_written"] == port.bytes_written - bytes_before == 6
+        assert port.write_calls - calls_before == 3
+        assert snapshot["frames_written"] - before["frames_written"] == 1   # Partial writes are not frames
+    finally:
+        connection.disconnectAll()
+
+
+def test_restart_after_stop_never_runs_two_writers():
+    rig, connection = connectRig()
+    try:
+        device = next(d for d in connection.devices if d.isConnected())
+        writer = device.writer
+        writer.send_timeout = 0.3
+        name = f"SerialWriter-{device.port_info.device}"
+        device.serial_port.stall(10)   # Every write times out, so the frame is retried until send_timeout
+        connection.setValveState(device.start_number, True)
+        time.sleep(0.05)
+
+        writer.stop(timeout=0)   # Do not wait for the frame; the thread is still retrying it
+        assert not any(thread.name == name for thread in threading.enumerate())
+        assert writer.frames_failed == 1
+        writer.start()
+        assert sum(thread.name == name for thread in threading.enumerate()) == 1
+    finally:
+        connection.disconnectAll()